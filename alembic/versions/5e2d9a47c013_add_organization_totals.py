@@ -0,0 +1,40 @@
+"""Add organization_totals counter table
+
+Revision ID: 5e2d9a47c013
+Revises: c81f0b6e94d2
+Create Date: 2026-10-16 10:41:05.118364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2d9a47c013'
+down_revision: Union[str, Sequence[str], None] = 'c81f0b6e94d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('organization_totals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('total_steps', sa.Integer(), nullable=False),
+    sa.Column('total_distance', sa.Float(), nullable=False),
+    sa.Column('log_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Backfill the single counter row from existing logs
+    op.execute(
+        "INSERT INTO organization_totals (id, total_steps, total_distance, log_count) "
+        "SELECT 1, COALESCE(SUM(step_count), 0), COALESCE(SUM(distance_km), 0.0), COUNT(id) "
+        "FROM running_logs"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('organization_totals')
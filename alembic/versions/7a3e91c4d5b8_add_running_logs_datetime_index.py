@@ -0,0 +1,28 @@
+"""Add (running_datetime, step_count, distance_km) index to running_logs
+
+Revision ID: 7a3e91c4d5b8
+Revises: b6d1f08c3a27
+Create Date: 2026-10-16 16:20:11.304517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3e91c4d5b8'
+down_revision: Union[str, Sequence[str], None] = 'b6d1f08c3a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_running_logs_datetime_steps', 'running_logs', ['running_datetime', 'step_count', 'distance_km'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_running_logs_datetime_steps', table_name='running_logs')
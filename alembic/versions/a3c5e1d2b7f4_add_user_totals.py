@@ -0,0 +1,41 @@
+"""Add user_totals aggregate table
+
+Revision ID: a3c5e1d2b7f4
+Revises: 4f19bb30fc45
+Create Date: 2026-10-16 09:12:31.402113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e1d2b7f4'
+down_revision: Union[str, Sequence[str], None] = '4f19bb30fc45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_totals',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_steps', sa.Integer(), nullable=False),
+    sa.Column('total_distance', sa.Float(), nullable=False),
+    sa.Column('log_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Backfill from existing logs
+    op.execute(
+        "INSERT INTO user_totals (user_id, total_steps, total_distance, log_count) "
+        "SELECT owner_id, SUM(step_count), SUM(distance_km), COUNT(id) "
+        "FROM running_logs WHERE owner_id IS NOT NULL GROUP BY owner_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_totals')
@@ -0,0 +1,45 @@
+"""Add weekly_totals rollup table
+
+Revision ID: c81f0b6e94d2
+Revises: a3c5e1d2b7f4
+Create Date: 2026-10-16 10:03:17.559820
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f0b6e94d2'
+down_revision: Union[str, Sequence[str], None] = 'a3c5e1d2b7f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('weekly_totals',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('week', sa.String(), nullable=False),
+    sa.Column('steps', sa.Integer(), nullable=False),
+    sa.Column('log_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('owner_id', 'week')
+    )
+    op.create_index('ix_weekly_totals_week', 'weekly_totals', ['week', 'steps', 'log_count'], unique=False)
+    # Backfill from existing logs. SQLite's %W matches Python's strftime("%Y-W%W");
+    # run `python -m backend.aggregates verify` afterwards to confirm.
+    op.execute(
+        "INSERT INTO weekly_totals (owner_id, week, steps, log_count) "
+        "SELECT owner_id, strftime('%Y-W%W', running_datetime), SUM(step_count), COUNT(id) "
+        "FROM running_logs WHERE owner_id IS NOT NULL "
+        "GROUP BY owner_id, strftime('%Y-W%W', running_datetime)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_weekly_totals_week', table_name='weekly_totals')
+    op.drop_table('weekly_totals')
@@ -0,0 +1,28 @@
+"""Add (owner_id, running_datetime, id) index to running_logs
+
+Revision ID: e4b7c2a9f158
+Revises: 5e2d9a47c013
+Create Date: 2026-10-16 11:27:44.903276
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7c2a9f158'
+down_revision: Union[str, Sequence[str], None] = '5e2d9a47c013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_running_logs_owner_datetime_id', 'running_logs', ['owner_id', 'running_datetime', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_running_logs_owner_datetime_id', table_name='running_logs')
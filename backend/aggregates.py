@@ -0,0 +1,224 @@
+"""
+Aggregates over running_logs that are maintained incrementally by the write paths.
+
+Every change to a running log is expressed as a signed delta and applied in the
+caller's transaction, so the aggregates commit (or roll back) together with the
+log itself. The rebuild routines recompute everything from running_logs and
+report any drift they had to correct.
+"""
+import argparse
+import math
+from collections import namedtuple
+
+from sqlalchemy import func
+# INSERT ... ON CONFLICT; SQLite is the only supported database
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+ORGANIZATION_ROW_ID = 1
+DATA_VERSION_ROW_ID = 1
+
+LogDelta = namedtuple("LogDelta", ["owner_id", "running_datetime", "steps", "distance", "count"])
+
+
+def log_delta(log: models.RunningLog, sign: int = 1) -> LogDelta:
+    """Delta contributed by `log`; use sign=-1 for the removal of its current values."""
+    return LogDelta(log.owner_id, log.running_datetime, sign * log.step_count, sign * log.distance_km, sign)
+
+
+def week_label(running_datetime) -> str:
+    return running_datetime.strftime("%Y-W%W")
+
+
+def bump_data_version(db: Session):
+    """Increments the data version behind ETags. Does not commit."""
+    table = models.DataVersion.__table__
+    stmt = insert(table).values(id=DATA_VERSION_ROW_ID, version=1)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.id], set_={"version": table.c.version + 1})
+    db.execute(stmt)
+
+
+def apply_log_deltas(db: Session, deltas):
+    """Applies deltas to the aggregate tables. Does not commit."""
+    per_user = {}
+    per_week = {}
+    org_steps, org_distance, org_count = 0, 0.0, 0
+    for delta in deltas:
+        org_steps += delta.steps
+        org_distance += delta.distance
+        org_count += delta.count
+        steps, distance, count = per_user.get(delta.owner_id, (0, 0.0, 0))
+        per_user[delta.owner_id] = (steps + delta.steps, distance + delta.distance, count + delta.count)
+        key = (delta.owner_id, week_label(delta.running_datetime))
+        steps, count = per_week.get(key, (0, 0))
+        per_week[key] = (steps + delta.steps, count + delta.count)
+
+    # Increment in SQL rather than read-modify-write so concurrent writers cannot lose updates
+    table = models.UserTotals.__table__
+    for user_id, (steps, distance, count) in per_user.items():
+        stmt = insert(table).values(user_id=user_id, total_steps=steps, total_distance=distance, log_count=count)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={
+                "total_steps": table.c.total_steps + steps,
+                "total_distance": table.c.total_distance + distance,
+                "log_count": table.c.log_count + count,
+            },
+        )
+        db.execute(stmt)
+
+    if per_user:
+        table = models.OrganizationTotals.__table__
+        stmt = insert(table).values(
+            id=ORGANIZATION_ROW_ID, total_steps=org_steps, total_distance=org_distance, log_count=org_count
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={
+                "total_steps": table.c.total_steps + org_steps,
+                "total_distance": table.c.total_distance + org_distance,
+                "log_count": table.c.log_count + org_count,
+            },
+        )
+        db.execute(stmt)
+
+    table = models.WeeklyTotals.__table__
+    for (owner_id, week), (steps, count) in per_week.items():
+        if steps == 0 and count == 0:
+            continue
+        stmt = insert(table).values(owner_id=owner_id, week=week, steps=steps, log_count=count)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.owner_id, table.c.week],
+            set_={"steps": table.c.steps + steps, "log_count": table.c.log_count + count},
+        )
+        db.execute(stmt)
+
+    if per_user:
+        bump_data_version(db)
+
+
+def _drift(expected: dict, current: dict, names):
+    drift = []
+    for key in sorted(set(expected) | set(current)):
+        want = expected.get(key, (0,) * len(names))
+        have = current.get(key, (0,) * len(names))
+        if any(not math.isclose(w, h, abs_tol=1e-6) for w, h in zip(want, have)):
+            drift.append({
+                "key": key,
+                "expected": dict(zip(names, want)),
+                "actual": dict(zip(names, have)),
+            })
+    return drift
+
+
+def rebuild_user_totals(db: Session, dry_run: bool = False):
+    """Recomputes user_totals from running_logs. Returns the rows that had drifted."""
+    expected = {
+        owner_id: (steps, distance, count)
+        for owner_id, steps, distance, count in db.query(
+            models.RunningLog.owner_id,
+            func.sum(models.RunningLog.step_count),
+            func.sum(models.RunningLog.distance_km),
+            func.count(models.RunningLog.id),
+        ).filter(models.RunningLog.owner_id.isnot(None)).group_by(models.RunningLog.owner_id)
+    }
+    current = {
+        row.user_id: (row.total_steps, row.total_distance, row.log_count)
+        for row in db.query(models.UserTotals)
+    }
+    drift = _drift(expected, current, ("total_steps", "total_distance", "log_count"))
+
+    if not dry_run:
+        db.query(models.UserTotals).delete()
+        db.add_all([
+            models.UserTotals(user_id=owner_id, total_steps=steps, total_distance=distance, log_count=count)
+            for owner_id, (steps, distance, count) in expected.items()
+        ])
+        bump_data_version(db)
+        db.commit()
+    return drift
+
+
+def rebuild_weekly_totals(db: Session, dry_run: bool = False):
+    """Recomputes weekly_totals from running_logs. Returns the rows that had drifted."""
+    expected = {}
+    # Labels are computed in Python, exactly as on the write path
+    rows = db.query(
+        models.RunningLog.owner_id, models.RunningLog.running_datetime, models.RunningLog.step_count
+    ).filter(models.RunningLog.owner_id.isnot(None)).yield_per(1000)
+    for owner_id, running_datetime, step_count in rows:
+        key = (owner_id, week_label(running_datetime))
+        steps, count = expected.get(key, (0, 0))
+        expected[key] = (steps + step_count, count + 1)
+    current = {
+        (row.owner_id, row.week): (row.steps, row.log_count)
+        for row in db.query(models.WeeklyTotals).filter(models.WeeklyTotals.log_count != 0)
+    }
+    drift = _drift(expected, current, ("steps", "log_count"))
+
+    if not dry_run:
+        db.query(models.WeeklyTotals).delete()
+        db.add_all([
+            models.WeeklyTotals(owner_id=owner_id, week=week, steps=steps, log_count=count)
+            for (owner_id, week), (steps, count) in expected.items()
+        ])
+        bump_data_version(db)
+        db.commit()
+    return drift
+
+
+def rebuild_organization_totals(db: Session, dry_run: bool = False):
+    """Recomputes the organization_totals row from running_logs. Returns it if it had drifted."""
+    steps, distance, count = db.query(
+        func.coalesce(func.sum(models.RunningLog.step_count), 0),
+        func.coalesce(func.sum(models.RunningLog.distance_km), 0.0),
+        func.count(models.RunningLog.id),
+    ).one()
+    expected = {ORGANIZATION_ROW_ID: (steps, distance, count)}
+    row = db.get(models.OrganizationTotals, ORGANIZATION_ROW_ID)
+    current = {ORGANIZATION_ROW_ID: (row.total_steps, row.total_distance, row.log_count)} if row else {}
+    drift = _drift(expected, current, ("total_steps", "total_distance", "log_count"))
+
+    if not dry_run:
+        db.merge(models.OrganizationTotals(
+            id=ORGANIZATION_ROW_ID, total_steps=steps, total_distance=distance, log_count=count
+        ))
+        bump_data_version(db)
+        db.commit()
+    return drift
+
+
+REBUILDERS = {
+    "user_totals": rebuild_user_totals,
+    "weekly_totals": rebuild_weekly_totals,
+    "organization_totals": rebuild_organization_totals,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild or verify running log aggregates.")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    parser.add_argument("--only", choices=sorted(REBUILDERS), help="Limit to a single aggregate table")
+    args = parser.parse_args(argv)
+
+    from .database import SessionLocal
+    total_drift = 0
+    db = SessionLocal()
+    try:
+        for name, rebuild in REBUILDERS.items():
+            if args.only and name != args.only:
+                continue
+            drift = rebuild(db, dry_run=args.command == "verify")
+            for row in drift:
+                print(f"{name} {row['key']}: expected {row['expected']}, found {row['actual']}")
+            print(f"{name}: {len(drift)} drifted row(s)")
+            total_drift += len(drift)
+    finally:
+        db.close()
+    return 1 if total_drift and args.command == "verify" else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
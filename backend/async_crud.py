@@ -0,0 +1,45 @@
+"""
+Async versions of the crud functions, for use with an AsyncSession.
+
+Each function runs the matching `crud` function through AsyncSession.run_sync,
+so queries go through the async driver (aiosqlite) and the event loop is free
+while SQLite works. `crud` stays the single implementation, shared with the
+synchronous callers (CLI tools, the audit writer thread). Functions are looked
+up on `crud` at call time.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+
+
+def _async(name: str):
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(getattr(crud, name), *args, **kwargs)
+    wrapper.__name__ = name
+    wrapper.__qualname__ = name
+    wrapper.__doc__ = getattr(crud, name).__doc__
+    return wrapper
+
+
+get_user = _async("get_user")
+get_user_by_email = _async("get_user_by_email")
+get_or_create_user = _async("get_or_create_user")
+update_user = _async("update_user")
+create_audit_log = _async("create_audit_log")
+get_running_logs = _async("get_running_logs")
+get_running_log_rows = _async("get_running_log_rows")
+create_running_log = _async("create_running_log")
+bulk_create_running_logs = _async("bulk_create_running_logs")
+update_running_log = _async("update_running_log")
+get_running_log = _async("get_running_log")
+delete_running_log = _async("delete_running_log")
+get_user_stats = _async("get_user_stats")
+get_user_summary = _async("get_user_summary")
+get_data_version = _async("get_data_version")
+get_organization_stats = _async("get_organization_stats")
+get_leaderboard = _async("get_leaderboard")
+count_users = _async("count_users")
+get_user_rank = _async("get_user_rank")
+get_weekly_stats = _async("get_weekly_stats")
+get_user_weekly_stats = _async("get_user_weekly_stats")
+get_step_series = _async("get_step_series")
@@ -0,0 +1,160 @@
+"""
+Audit log sink.
+
+In "transaction" mode an entry is added to the caller's session and commits
+together with the business write it describes. In "async" mode entries are
+held on the caller's session until it commits (and discarded if it rolls
+back), then queued; a background thread inserts them in batches, either when
+`batch_size` entries are waiting or every `flush_interval` seconds. A single
+writer drains the queue in FIFO order, so entries stay ordered per user.
+The queue holds at most `max_queue` entries: when the audit database falls
+behind that far, further entries are dropped and logged rather than letting
+memory grow or blocking requests. Entries are only ever inserted.
+"""
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import models, config
+
+logger = logging.getLogger(__name__)
+settings = config.get_settings()
+
+MODES = ("transaction", "async")
+
+# Entries recorded on a session in async mode, queued when it commits
+_PENDING_KEY = "runorg_audit_pending"
+
+
+class AuditSink:
+    def __init__(
+        self,
+        mode: str = "transaction",
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        session_factory=None,
+        max_queue: int = 10000,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown audit mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._session_factory = session_factory
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def record(self, db: Session, user_id: int, message: str):
+        """Records an audit entry. Either way it only takes effect when the caller commits `db`."""
+        created_at = datetime.now(timezone.utc)
+        if self.mode == "transaction":
+            db.add(models.AuditLog(user_id=user_id, message=message, created_at=created_at))
+            return
+        pending = db.info.get(_PENDING_KEY)
+        if pending is None:
+            pending = db.info[_PENDING_KEY] = []
+            event.listen(db, "after_commit", self._on_commit)
+            event.listen(db, "after_rollback", self._on_rollback)
+        pending.append({"user_id": user_id, "message": message, "created_at": created_at})
+
+    def _on_commit(self, db: Session):
+        entries = db.info.get(_PENDING_KEY)
+        if entries:
+            self._enqueue(entries)
+            entries.clear()
+
+    def _on_rollback(self, db: Session):
+        entries = db.info.get(_PENDING_KEY)
+        if entries:
+            entries.clear()
+
+    def _enqueue(self, entries):
+        dropped = 0
+        for entry in entries:
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                dropped += 1
+        if dropped:
+            self.dropped += dropped
+            logger.error(f"Audit queue full, dropped {dropped} entries")
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Writes every queued entry. Returns how many were written."""
+        with self._flush_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return 0
+
+            session_factory = self._session_factory
+            if session_factory is None:
+                from .database import SessionLocal
+                session_factory = SessionLocal
+            db = session_factory()
+            try:
+                db.execute(models.AuditLog.__table__.insert(), batch)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to write {len(batch)} audit entries: {e}")
+                # Put them back in front of anything queued meanwhile to keep ordering
+                remaining = []
+                while True:
+                    try:
+                        remaining.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._enqueue(batch + remaining)
+                raise
+            finally:
+                db.close()
+            return len(batch)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # already logged, retried on the next cycle
+
+    def start(self):
+        if self.mode != "async" or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the writer thread and flushes whatever is still queued."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        if self.mode == "async":
+            self.flush()
+
+
+sink = AuditSink(
+    mode=settings.RUNORG_AUDIT_MODE,
+    batch_size=settings.RUNORG_AUDIT_BATCH_SIZE,
+    flush_interval=settings.RUNORG_AUDIT_FLUSH_INTERVAL_SECONDS,
+    max_queue=settings.RUNORG_AUDIT_MAX_QUEUE,
+)
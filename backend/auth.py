@@ -1,89 +1,242 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from jose import jwt, JWTError
-import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 logger = logging.getLogger(__name__)
-from . import crud, models, config
-from .database import get_db
+from . import async_crud, models, config, http_client
+from .database import get_async_db
 
 settings = config.get_settings()
 security = HTTPBearer()
 
+# python-jose (and the cryptography backend it loads) is imported on first use
+# rather than with the app, so CLIs and migrations never pay for it. The app
+# lifespan loads it up front through warmup.
+
 def create_access_token(data: dict):
+    from jose import jwt
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.RUNORG_JWT_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.RUNORG_JWT_SECRET, algorithm=settings.RUNORG_JWT_ALGORITHM)
     return encoded_jwt
 
-# Simple in-memory cache for OIDC config
-_oidc_config_cache = {}
+class OIDCMetadataCache:
+    """
+    Discovery document and JWKS of one issuer, cached with a TTL.
+
+    Signing keys are indexed by `kid`. A token signed with an unknown `kid` forces a
+    refresh (key rotation), rate limited by `min_refresh_interval`. Refreshes run under
+    a lock so concurrent callers on a cold or expired cache trigger a single fetch.
+    Fetches go through the shared http_client.
+    """
+
+    def __init__(self, issuer: str, ttl: float, min_refresh_interval: float, clock=time.monotonic):
+        self.issuer = issuer
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._clock = clock
+        self._lock = asyncio.Lock()
+        self._discovery = None
+        self._keys = {}
+        self._expires_at = 0.0
+        self._last_refresh = None
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def _fresh(self) -> bool:
+        return self._discovery is not None and self._clock() < self._expires_at
+
+    async def _refresh(self):
+        client = http_client.get_http_client()
+        resp = await client.get(f"{self.issuer}/.well-known/openid-configuration")
+        resp.raise_for_status()
+        discovery = resp.json()
+        keys = {}
+        if discovery.get("jwks_uri"):
+            jwks_resp = await client.get(discovery["jwks_uri"])
+            jwks_resp.raise_for_status()
+            keys = {key.get("kid"): key for key in jwks_resp.json().get("keys", [])}
+
+        self._discovery = discovery
+        self._keys = keys
+        self._last_refresh = self._clock()
+        self._expires_at = self._last_refresh + self.ttl
+        self.stats["refreshes"] += 1
+
+    async def _ensure(self, force: bool = False):
+        if self._fresh() and not force:
+            return
+        async with self._lock:
+            # Another request may have refreshed while we waited for the lock
+            if self._fresh() and not force:
+                return
+            if force and self._last_refresh is not None and self._clock() - self._last_refresh < self.min_refresh_interval:
+                return
+            try:
+                await self._refresh()
+            except Exception:
+                self.stats["refresh_errors"] += 1
+                raise
+
+    async def get_discovery(self) -> dict:
+        if self._fresh():
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            await self._ensure()
+        return self._discovery
+
+    async def get_signing_keys(self, kid) -> dict:
+        """Returns the JWK for `kid`, or the whole key set if the token has no kid."""
+        if self._fresh() and (kid is None or kid in self._keys):
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            await self._ensure()
+            if kid is not None and kid not in self._keys:
+                await self._ensure(force=True)
+
+        if kid is None:
+            return {"keys": list(self._keys.values())}
+        if kid not in self._keys:
+            from jose import JWTError
+            raise JWTError(f"Unknown signing key id {kid}")
+        return self._keys[kid]
+
 
-def get_oidc_config_url(issuer: str) -> str:
+_oidc_caches = {}
+_oidc_caches_lock = threading.Lock()
+
+def get_oidc_cache(issuer: str) -> OIDCMetadataCache:
+    cache = _oidc_caches.get(issuer)
+    if cache is None:
+        with _oidc_caches_lock:
+            cache = _oidc_caches.get(issuer)
+            if cache is None:
+                cache = OIDCMetadataCache(
+                    issuer,
+                    ttl=settings.OIDC_JWKS_CACHE_TTL_SECONDS,
+                    min_refresh_interval=settings.OIDC_JWKS_MIN_REFRESH_SECONDS,
+                )
+                _oidc_caches[issuer] = cache
+    return cache
+
+def reset_oidc_caches():
+    with _oidc_caches_lock:
+        _oidc_caches.clear()
+
+async def get_oidc_config_url(issuer: str) -> str:
     """Discovers the authorization endpoint from the issuer."""
     if not issuer:
         return ""
-        
-    if issuer in _oidc_config_cache:
-        return _oidc_config_cache[issuer].get("authorization_endpoint", "")
-        
-    discovery_url = f"{issuer}/.well-known/openid-configuration"
+
     try:
-        with httpx.Client() as client:
-            resp = client.get(discovery_url, timeout=5.0)
-            if resp.status_code == 200:
-                config = resp.json()
-                _oidc_config_cache[issuer] = config
-                return config.get("authorization_endpoint", "")
+        discovery = await get_oidc_cache(issuer).get_discovery()
+        return discovery.get("authorization_endpoint", "")
     except Exception as e:
         logger.error(f"Failed to discover OIDC config for {issuer}: {e}")
-        
+
     return ""
 
-def verify_oidc_token(token: str) -> dict:
+async def verify_oidc_token(token: str) -> dict:
     """Verifies the OIDC token with the provider's JWKS."""
     if not settings.OIDC_ISSUER:
         raise ValueError("OIDC_ISSUER not configured")
-        
-    discovery_url = f"{settings.OIDC_ISSUER}/.well-known/openid-configuration"
-    jwks_client = httpx.Client()
-    try:
-         resp = jwks_client.get(discovery_url)
-         resp.raise_for_status()
-         oidc_config = resp.json()
-         jwks_uri = oidc_config["jwks_uri"]
-         
-         jwks_resp = jwks_client.get(jwks_uri)
-         jwks_resp.raise_for_status()
-         # Check if 'keys' is in response
-         jwks = jwks_resp.json()
-         
-         return jwt.decode(
-             token,
-             jwks,
-             algorithms=settings.OIDC_ALGORITHMS,
-             audience=settings.OIDC_AUDIENCE,
-             issuer=settings.OIDC_ISSUER
-         )
-    finally:
-        jwks_client.close()
+
+    from jose import jwt
+    kid = jwt.get_unverified_header(token).get("kid")
+    key = await get_oidc_cache(settings.OIDC_ISSUER).get_signing_keys(kid)
+    return jwt.decode(
+        token,
+        key,
+        algorithms=settings.OIDC_ALGORITHMS,
+        audience=settings.OIDC_AUDIENCE,
+        issuer=settings.OIDC_ISSUER
+    )
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by request handlers."""
+    id: int
+    email: str
+    firstname: Optional[str] = None
+    lastname: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(id=user.id, email=user.email, firstname=user.firstname, lastname=user.lastname)
+
+
+class PrincipalCache:
+    """Bounded LRU of verified internal tokens. Entries expire with the token or after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if self._clock() >= expires_at:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, principal: Principal, token_expires_at: float):
+        if self.maxsize <= 0:
+            return
+        expires_at = min(token_expires_at, self._clock() + self.ttl)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in [t for t, (p, _) in self._entries.items() if p.id == user_id]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache(settings.RUNORG_PRINCIPAL_CACHE_SIZE, settings.RUNORG_PRINCIPAL_CACHE_TTL_SECONDS)
 
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> models.User:
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
     token = credentials.credentials
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    from jose import JWTError, jwt
     try:
         # Verify internal JWT
         payload = jwt.decode(
@@ -98,13 +251,23 @@ async def get_current_user(
             
         email = email.lower()
         
-    except (JWTError, httpx.HTTPError) as e:
+    except JWTError as e:
         logger.error(f"Auth error: {e}")
         raise credentials_exception
         
-    user = crud.get_user_by_email(db, email=email)
-    if user is None:
-        user = crud.create_user(db, email=email)
-        crud.create_audit_log(db, user_id=user.id, message="User created via login")
-        
-    return user
+    user = await async_crud.get_or_create_user(db, email=email, audit_message="User created via login")
+
+    principal = Principal.from_user(user)
+    principal_cache.put(token, principal, payload.get("exp", 0))
+    return principal
+
+
+def is_admin(principal: Principal) -> bool:
+    admins = {email.strip().lower() for email in settings.RUNORG_ADMIN_EMAILS.split(",") if email.strip()}
+    return principal.email.lower() in admins
+
+
+async def get_current_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
+    if not is_admin(current_user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
@@ -0,0 +1,36 @@
+"""Conditional GET: strong ETags derived from the data version, If-None-Match and 304 responses."""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag over `parts`, typically the route name, the data version and any settings in the body."""
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison, so a W/ prefix added by a proxy still matches
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def check(request: Request, response: Response, etag: str, cache_control: str) -> Optional[Response]:
+    """
+    Sets ETag and Cache-Control on `response`. Returns a bodyless 304 to send
+    instead when the client already holds this representation, else None.
+
+    Read the data version before the data it describes: a write landing in
+    between then yields an older tag on newer data, which the next poll corrects,
+    never the other way round.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -4,6 +4,24 @@ from typing import List
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./sql_app.db"
+
+    # SQLite engine profile, applied to every connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_CACHE_SIZE_KIB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # Connection pool, size it to the number of threads a worker runs DB work on
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    # Read-only engine behind GET routes (get_read_db), pooled separately from writes.
+    # Empty opens DATABASE_URL read-only; set it to a replica's URL where there is one
+    DATABASE_READ_URL: str = ""
+    DB_READ_POOL_SIZE: int = 10
+    DB_READ_MAX_OVERFLOW: int = 20
+    # Prime the auth stack, DB pools and OIDC metadata in the lifespan, before serving
+    RUNORG_WARMUP_ENABLED: bool = True
     SECRET_KEY: str = "your-secret-key"
     ALGORITHM: str = "HS256"
     
@@ -13,6 +31,39 @@ class Settings(BaseSettings):
     RUNORG_TOTAL_STEP_GOAL: int = 1000000
     RUNORG_STEP_PER_KM: int = 1500
     RUNORG_TOP_USER: int = 5
+    RUNORG_LEADERBOARD_PAGE_SIZE: int = 50 # Default page size of ?page= on /api/stats/leaderboard
+    RUNORG_RANK_WINDOW: int = 2 # Entries above and below the caller on /api/me/rank
+    RUNORG_BULK_CHUNK_SIZE: int = 500
+    RUNORG_BULK_MAX_ROWS: int = 10000 # Rows read from one import; reading stops there
+    RUNORG_BULK_MAX_BODY_BYTES: int = 16 * 1024 * 1024 # Bytes read from one import body; reading stops there
+    RUNORG_BULK_MAX_JSON_BYTES: int = 1024 * 1024 # JSON array bodies are parsed whole; larger imports must use NDJSON
+    RUNORG_ADMIN_EMAILS: str = "" # Comma separated emails allowed to use /api/admin
+    RUNORG_EXPORT_CHUNK_SIZE: int = 1000 # Rows fetched and encoded at a time by exports
+    RUNORG_STATS_CACHE_MAX_AGE_SECONDS: int = 5 # Cache-Control max-age of /api/stats/* responses
+
+    # Precomputed dashboard snapshot (/api/stats/snapshot)
+    RUNORG_SNAPSHOT_POLL_SECONDS: float = 1.0 # How often the builder checks the data version
+    RUNORG_SNAPSHOT_INTERVAL_SECONDS: float = 60.0 # Rebuild at least this often, even without changes
+    RUNORG_SNAPSHOT_MAX_STALENESS_SECONDS: float = 10.0 # Never serve a snapshot unconfirmed for longer
+
+    # Live stats stream (/api/stats/live)
+    RUNORG_LIVE_POLL_INTERVAL_SECONDS: float = 1.0
+    RUNORG_LIVE_QUEUE_SIZE: int = 16 # Frames a subscriber may lag behind before it is dropped
+    RUNORG_LIVE_KEEPALIVE_SECONDS: float = 15.0
+
+    # Prometheus metrics on /metrics, off by default; restrict access to the route at the load balancer
+    RUNORG_METRICS_ENABLED: bool = False
+
+    # Per-request statement log: Server-Timing header, warnings for repeated statements and busy requests
+    RUNORG_QUERY_INSTRUMENTATION: bool = False
+    RUNORG_QUERY_BUDGET: int = 20 # Statements per request before a warning is logged
+    RUNORG_QUERY_REPEAT_THRESHOLD: int = 3 # Same-shape statements per request that suggest an N+1
+
+    # Audit log: "transaction" commits entries with the business write, "async" batches them in the background
+    RUNORG_AUDIT_MODE: str = "transaction"
+    RUNORG_AUDIT_BATCH_SIZE: int = 100
+    RUNORG_AUDIT_FLUSH_INTERVAL_SECONDS: float = 1.0
+    RUNORG_AUDIT_MAX_QUEUE: int = 10000 # Async mode drops (and logs) entries beyond this many waiting
     
     # Auth Config
     AUTH0_DOMAIN: str = ""
@@ -28,11 +79,21 @@ class Settings(BaseSettings):
     OIDC_CALLBACK_URL: str = ""
     OIDC_ALGORITHMS: List[str] = ["RS256"]
     OIDC_AUTH_URL: str = "" # Optional, for frontend redirect
+    OIDC_JWKS_CACHE_TTL_SECONDS: int = 3600
+    OIDC_JWKS_MIN_REFRESH_SECONDS: int = 30 # Rate limit for refreshes forced by an unknown kid
+    # Shared outbound HTTP client for OIDC traffic
+    OIDC_HTTP_TIMEOUT_SECONDS: float = 5.0
+    OIDC_HTTP_MAX_CONNECTIONS: int = 20
+    OIDC_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    OIDC_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    OIDC_HTTP2: bool = False # Requires the h2 package (httpx[http2])
     
     # Internal JWT Config
     RUNORG_JWT_SECRET: str = "change-this-to-secure-random-secret"
     RUNORG_JWT_ALGORITHM: str = "HS256"
     RUNORG_JWT_EXPIRE_MINUTES: int = 60
+    RUNORG_PRINCIPAL_CACHE_SIZE: int = 10000 # 0 disables the verified-token cache
+    RUNORG_PRINCIPAL_CACHE_TTL_SECONDS: int = 300
 
     model_config = SettingsConfigDict(env_file=".env")
 
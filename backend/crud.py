@@ -1,5 +1,8 @@
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
-from . import models, schemas
+from . import models, schemas, aggregates
+from .audit import sink as audit_sink
 
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
@@ -7,34 +10,121 @@ def get_user(db: Session, user_id: int):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def create_user(db: Session, email: str):
-    db_user = models.User(email=email)
-    db.add(db_user)
+def get_or_create_user(db: Session, email: str, audit_message: str = "User created"):
+    """
+    The user with `email` (lowercased), created on first sight. Creation is a
+    single INSERT ... ON CONFLICT DO NOTHING RETURNING, committed together with
+    its audit entry and a data version bump (users without logs rank at 0
+    steps). If a concurrent request inserted the same email first,
+    nothing is returned and the winner's row is read instead of failing on the
+    unique index.
+    """
+    email = email.lower()
+    user = get_user_by_email(db, email)
+    if user is not None:
+        return user
+
+    stmt = (
+        insert(models.User)
+        .values(email=email)
+        .on_conflict_do_nothing(index_elements=[models.User.email])
+        .returning(models.User)
+    )
+    user = db.scalars(stmt).first()
+    if user is None:
+        db.rollback()
+        return get_user_by_email(db, email)
+    aggregates.bump_data_version(db)
+    audit_sink.record(db, user.id, audit_message)
     db.commit()
-    db.refresh(db_user)
-    return db_user
+    return user
 
 def update_user(db: Session, user: models.User, user_update: schemas.UserUpdate):
     if user_update.firstname is not None:
         user.firstname = user_update.firstname
     if user_update.lastname is not None:
         user.lastname = user_update.lastname
+    audit_sink.record(db, user.id, "Updated user profile")
+    # Names show up in /api/me and the leaderboard
+    aggregates.bump_data_version(db)
     db.commit()
     db.refresh(user)
     return user
 
 def create_audit_log(db: Session, user_id: int, message: str):
-    db_log = models.AuditLog(user_id=user_id, message=message)
-    db.add(db_log)
+    """Records an audit entry on its own, for actions without a business write to join."""
+    audit_sink.record(db, user_id, message)
     db.commit()
-    db.refresh(db_log)
-    return db_log
 
-def get_running_logs(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.RunningLog).filter(models.RunningLog.owner_id == user_id).offset(skip).limit(limit).all()
+def _running_logs_select(stmt, user_id: int, skip: int, limit: int, after):
+    log = models.RunningLog
+    stmt = stmt.where(log.owner_id == user_id)
+    if after is not None:
+        stmt = stmt.where(tuple_(log.running_datetime, log.id) > tuple_(*after))
+    return stmt.order_by(log.running_datetime, log.id).offset(skip).limit(limit)
+
+def get_running_logs(db: Session, user_id: int, skip: int = 0, limit: int = 100, after=None):
+    """Logs ordered by (running_datetime, id). `after` is a (running_datetime, id) keyset position."""
+    return db.scalars(_running_logs_select(select(models.RunningLog), user_id, skip, limit, after)).all()
+
+# Columns of schemas.RunningLog, in its field order
+RUNNING_LOG_COLUMNS = (
+    models.RunningLog.running_datetime,
+    models.RunningLog.step_count,
+    models.RunningLog.distance_km,
+    models.RunningLog.id,
+    models.RunningLog.owner_id,
+    models.RunningLog.created_at,
+)
+
+def get_running_log_rows(db: Session, user_id: int, skip: int = 0, limit: int = 100, after=None):
+    """
+    Same logs as get_running_logs, as plain dicts of RUNNING_LOG_COLUMNS. Selects
+    only those columns and builds no ORM instances, for listing endpoints that
+    serialize the rows straight away with schemas.running_log_rows.
+    """
+    names = [column.key for column in RUNNING_LOG_COLUMNS]
+    rows = db.execute(_running_logs_select(select(*RUNNING_LOG_COLUMNS), user_id, skip, limit, after))
+    return [dict(zip(names, row)) for row in rows]
 
 def create_running_log(db: Session, log: models.RunningLog, user_id: int):
     db.add(log)
+    db.flush()
+    aggregates.apply_log_deltas(db, [aggregates.log_delta(log)])
+    audit_sink.record(db, user_id, f"Created log id {log.id}")
+    db.commit()
+    db.refresh(log)
+    return log
+
+def bulk_create_running_logs(db: Session, logs: list):
+    """
+    Inserts `logs` (unsaved RunningLog objects, left unsaved) in one multi-row
+    INSERT ... RETURNING and updates the aggregates once, in a single
+    transaction. Returns the new ids, in the order of `logs`.
+    """
+    if not logs:
+        return []
+    rows = [
+        {"owner_id": log.owner_id, "running_datetime": log.running_datetime,
+         "step_count": log.step_count, "distance_km": log.distance_km}
+        for log in logs
+    ]
+    # One multi-row statement per page of insertmanyvalues. RETURNING order is not
+    # guaranteed, and sort_by_parameter_order would fall back to one INSERT per row
+    # on SQLite; its rowids are assigned in VALUES order, so sorted ids match `logs`.
+    ids = sorted(db.execute(insert(models.RunningLog).returning(models.RunningLog.id), rows).scalars())
+    aggregates.apply_log_deltas(db, [aggregates.log_delta(log) for log in logs])
+    db.commit()
+    return ids
+
+def update_running_log(db: Session, log: models.RunningLog, step_count: int, distance_km: float, running_datetime=None):
+    old = aggregates.log_delta(log, sign=-1)
+    log.step_count = step_count
+    log.distance_km = distance_km
+    if running_datetime:
+        log.running_datetime = running_datetime
+    aggregates.apply_log_deltas(db, [old, aggregates.log_delta(log)])
+    audit_sink.record(db, log.owner_id, f"Updated log id {log.id}")
     db.commit()
     db.refresh(log)
     return log
@@ -45,55 +135,142 @@ def get_running_log(db: Session, log_id: int, user_id: int):
 def delete_running_log(db: Session, log_id: int, user_id: int):
     log = get_running_log(db, log_id, user_id)
     if log:
+        aggregates.apply_log_deltas(db, [aggregates.log_delta(log, sign=-1)])
+        audit_sink.record(db, user_id, f"Deleted log id {log_id}")
         db.delete(log)
         db.commit()
     return log
 
 def get_user_stats(db: Session, user_id: int):
-    logs = db.query(models.RunningLog).filter(models.RunningLog.owner_id == user_id).all()
-    total_steps = sum(log.step_count for log in logs)
-    total_distance = sum(log.distance_km for log in logs)
-    return {"total_steps": total_steps, "total_distance": total_distance}
+    totals = db.get(models.UserTotals, user_id)
+    if totals is None:
+        return {"total_steps": 0, "total_distance": 0.0}
+    return {"total_steps": totals.total_steps, "total_distance": totals.total_distance}
+
+def get_user_summary(db: Session, user_id: int):
+    """Profile and totals of one user in a single primary-key lookup. None for an unknown user."""
+    row = (
+        db.query(models.User, models.UserTotals)
+        .outerjoin(models.UserTotals, models.UserTotals.user_id == models.User.id)
+        .filter(models.User.id == user_id)
+        .one_or_none()
+    )
+    if row is None:
+        return None
+    user, totals = row
+    return {
+        "email": user.email,
+        "firstname": user.firstname,
+        "lastname": user.lastname,
+        "total_steps": totals.total_steps if totals else 0,
+        "total_distance": totals.total_distance if totals else 0.0
+    }
+
+def get_data_version(db: Session) -> int:
+    version = db.query(models.DataVersion.version).filter(models.DataVersion.id == aggregates.DATA_VERSION_ROW_ID).scalar()
+    return version or 0
 
 def get_organization_stats(db: Session, goal: int):
-    total_steps = db.query(models.RunningLog).with_entities(models.RunningLog.step_count).all()
-    total_steps_sum = sum(step[0] for step in total_steps)
+    totals = db.get(models.OrganizationTotals, aggregates.ORGANIZATION_ROW_ID)
+    total_steps_sum = totals.total_steps if totals else 0
     percentage = (total_steps_sum / goal) * 100 if goal > 0 else 0
     return {"total_steps": total_steps_sum, "percentage": percentage, "goal": goal}
 
-def get_leaderboard(db: Session, limit: int = 5):
-    # This is a naive implementation. For large datasets, use SQL aggregation.
-    users = db.query(models.User).all()
-    leaderboard = []
-    for user in users:
-        stats = get_user_stats(db, user.id)
-        leaderboard.append({"user": user, "steps": stats["total_steps"]})
-    
-    leaderboard.sort(key=lambda x: x["steps"], reverse=True)
-    return leaderboard[:limit]
+def _ranked_users():
+    """Every user with their steps, competition rank (ties share a rank), percent rank, total and list position."""
+    steps = func.coalesce(models.UserTotals.total_steps, 0)
+    return (
+        select(
+            models.User.id.label("user_id"),
+            steps.label("steps"),
+            func.rank().over(order_by=steps.desc()).label("rank"),
+            func.percent_rank().over(order_by=steps.desc()).label("percent_rank"),
+            func.count().over().label("total"),
+            # Ties are listed by user id
+            func.row_number().over(order_by=(steps.desc(), models.User.id)).label("position"),
+        )
+        .select_from(models.User)
+        .outerjoin(models.UserTotals, models.UserTotals.user_id == models.User.id)
+        .subquery("ranked")
+    )
+
+def get_leaderboard(db: Session, limit: int = 5, offset: int = 0):
+    # Users without logs count as 0 steps
+    ranked = _ranked_users()
+    rows = (
+        db.query(models.User, ranked.c.steps, ranked.c.rank)
+        .join(ranked, ranked.c.user_id == models.User.id)
+        .order_by(ranked.c.position)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    return [{"user": user, "steps": user_steps, "rank": rank} for user, user_steps, rank in rows]
+
+def count_users(db: Session) -> int:
+    return db.query(func.count(models.User.id)).scalar()
+
+def get_user_rank(db: Session, user_id: int, around: int = 2):
+    """Rank of `user_id` and the `around` leaderboard entries on either side. None for an unknown user."""
+    ranked = _ranked_users()
+    me = db.query(ranked).filter(ranked.c.user_id == user_id).one_or_none()
+    if me is None:
+        return None
+    rows = (
+        db.query(models.User, ranked.c.steps, ranked.c.rank)
+        .join(ranked, ranked.c.user_id == models.User.id)
+        .filter(ranked.c.position.between(me.position - around, me.position + around))
+        .order_by(ranked.c.position)
+        .all()
+    )
+    return {
+        "rank": me.rank,
+        "steps": me.steps,
+        "total_users": me.total,
+        # 100 for the leader(s), 0 for the last place
+        "percentile": (1 - me.percent_rank) * 100,
+        "around": [{"user": user, "steps": user_steps, "rank": rank} for user, user_steps, rank in rows],
+    }
 
 def get_weekly_stats(db: Session):
-    # Naive implementation. Use SQL group by for efficiency.
-    logs = db.query(models.RunningLog).all()
-    weekly_data = {}
-    for log in logs:
-        # ISO week format: "YYYY-Www"
-        week = log.running_datetime.strftime("%Y-W%W")
-        if week not in weekly_data:
-            weekly_data[week] = 0
-        weekly_data[week] += log.step_count
-        
-    sorted_weeks = sorted(weekly_data.items())
-    return [{"week": k, "steps": v} for k, v in sorted_weeks]
+    steps = func.sum(models.WeeklyTotals.steps)
+    rows = (
+        db.query(models.WeeklyTotals.week, steps)
+        .group_by(models.WeeklyTotals.week)
+        .having(func.sum(models.WeeklyTotals.log_count) > 0)
+        .order_by(models.WeeklyTotals.week)
+        .all()
+    )
+    return [{"week": week, "steps": week_steps} for week, week_steps in rows]
+
+SERIES_GRANULARITIES = ("day", "week", "month")
+
+def _series_bucket(granularity: str, column):
+    """SQL expression labelling `column` with its day (2023-01-31), week (2023-W05) or month (2023-01)."""
+    # SQLite's strftime; %W weeks start on Monday, days before the first Monday are week 00
+    return func.strftime({"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}[granularity], column)
+
+def get_step_series(db: Session, granularity: str, start, end, user_id: int = None):
+    """Steps, distance and log count per bucket for logs in [start, end), summed in SQL. Empty buckets are omitted."""
+    log = models.RunningLog
+    period = _series_bucket(granularity, log.running_datetime).label("period")
+    query = db.query(period, func.sum(log.step_count), func.sum(log.distance_km), func.count(log.id)).filter(
+        log.running_datetime >= start, log.running_datetime < end
+    )
+    if user_id is not None:
+        query = query.filter(log.owner_id == user_id)
+    # By output name, so the strftime format is bound once rather than repeated per clause
+    rows = query.group_by(text("period")).order_by(period).all()
+    return [
+        {"period": label, "steps": steps, "distance_km": distance, "log_count": count}
+        for label, steps, distance, count in rows
+    ]
 
 def get_user_weekly_stats(db: Session, user_id: int):
-    logs = db.query(models.RunningLog).filter(models.RunningLog.owner_id == user_id).all()
-    weekly_data = {}
-    for log in logs:
-        week = log.running_datetime.strftime("%Y-W%W")
-        if week not in weekly_data:
-            weekly_data[week] = 0
-        weekly_data[week] += log.step_count
-        
-    sorted_weeks = sorted(weekly_data.items())
-    return [{"week": k, "steps": v} for k, v in sorted_weeks]
+    rows = (
+        db.query(models.WeeklyTotals.week, models.WeeklyTotals.steps)
+        .filter(models.WeeklyTotals.owner_id == user_id, models.WeeklyTotals.log_count > 0)
+        .order_by(models.WeeklyTotals.week)
+        .all()
+    )
+    return [{"week": week, "steps": week_steps} for week, week_steps in rows]
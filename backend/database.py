@@ -1,16 +1,125 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from .config import get_settings
+from . import metrics, querylog
 
 settings = get_settings()
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def sqlite_pragmas(settings, read_only: bool = False) -> dict:
+    """PRAGMAs of the SQLite engine profile, in the order they are applied."""
+    pragmas = {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        # Negative cache_size is in KiB rather than pages
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KIB,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+    }
+    if read_only:
+        # The journal mode is a property of the file, a read-only connection cannot set it
+        del pragmas["journal_mode"], pragmas["synchronous"]
+        pragmas["query_only"] = 1
+    return pragmas
+
+def apply_sqlite_pragmas(engine, pragmas: dict):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def is_memory_sqlite(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and (not url.database or url.database == ":memory:")
+
+def read_only_url(url):
+    """`url` opened read-only: SQLite files through a mode=ro URI, other databases unchanged."""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or is_memory_sqlite(url) or url.query.get("uri"):
+        return url
+    path = os.path.abspath(url.database)
+    return url.set(database=f"file:{path}", query={**url.query, "mode": "ro", "uri": "true"})
+
+def _pool_options(settings, read_only: bool) -> dict:
+    return dict(
+        pool_size=settings.DB_READ_POOL_SIZE if read_only else settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_READ_MAX_OVERFLOW if read_only else settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    )
+
+def create_db_engine(url: str, settings=settings, read_only: bool = False):
+    """Builds an engine with the configured pool and, for SQLite, the pragma profile."""
+    url = read_only_url(url) if read_only else make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(url, pool_pre_ping=True, **_pool_options(settings, read_only))
+
+    kwargs = {}
+    if not is_memory_sqlite(url):
+        kwargs.update(_pool_options(settings, read_only))
+        if settings.RUNORG_METRICS_ENABLED:
+            kwargs["poolclass"] = metrics.timed_pool(QueuePool, "sync-read" if read_only else "sync")
+    engine = create_engine(url, connect_args={"check_same_thread": False}, **kwargs)
+    apply_sqlite_pragmas(engine, sqlite_pragmas(settings, read_only))
+    return engine
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite"}
+
+def async_url(url: str):
+    """Same database as `url`, through the dialect's asyncio driver."""
+    url = make_url(url)
+    if url.get_backend_name() in ASYNC_DRIVERS and not url.get_dialect().is_async:
+        url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    return url
+
+def create_async_db_engine(url: str, settings=settings, read_only: bool = False):
+    """Async counterpart of create_db_engine, with the same pool and pragma profile."""
+    url = async_url(read_only_url(url) if read_only else url)
+    kwargs = {}
+    if not is_memory_sqlite(url):
+        kwargs.update(_pool_options(settings, read_only))
+        if settings.RUNORG_METRICS_ENABLED:
+            kwargs["poolclass"] = metrics.timed_pool(AsyncAdaptedQueuePool, "async-read" if read_only else "async")
+    engine = create_async_engine(url, **kwargs)
+    if url.get_backend_name() == "sqlite":
+        apply_sqlite_pragmas(engine.sync_engine, sqlite_pragmas(settings, read_only))
+    return engine
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_db_engine(SQLALCHEMY_DATABASE_URL)
+# Objects must stay usable after commit: lazy loads cannot happen outside the session's greenlet
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Reads get their own connections, so analytics traffic cannot hold every
+# connection the write path needs. An in-memory database exists once per
+# connection and cannot be reopened, reads share the write engine there.
+SQLALCHEMY_READ_DATABASE_URL = settings.DATABASE_READ_URL or SQLALCHEMY_DATABASE_URL
+if is_memory_sqlite(SQLALCHEMY_READ_DATABASE_URL):
+    async_read_engine = async_engine
+else:
+    async_read_engine = create_async_db_engine(SQLALCHEMY_READ_DATABASE_URL, read_only=True)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+_instrumented = [(engine, "sync"), (async_engine.sync_engine, "async")]
+if async_read_engine is not async_engine:
+    _instrumented.append((async_read_engine.sync_engine, "async-read"))
+# One statement listener per engine feeds the request's QueryLog, which metrics and the query log both read
+for _target, _name in _instrumented:
+    if settings.RUNORG_METRICS_ENABLED:
+        metrics.instrument_engine(_target, _name)
+    elif settings.RUNORG_QUERY_INSTRUMENTATION:
+        querylog.instrument_engine(_target)
+
 Base = declarative_base()
 
 def get_db():
@@ -19,3 +128,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db():
+    """Session on the read-only engine, for routes that never write."""
+    async with AsyncReadSessionLocal() as db:
+        yield db
@@ -0,0 +1,188 @@
+"""
+Streaming exports of running logs and aggregates as CSV or NDJSON, optionally gzipped.
+
+Rows are read with a server-side cursor in partitions of RUNORG_EXPORT_CHUNK_SIZE
+and each partition is encoded (and compressed) before the next one is fetched,
+so memory use does not depend on the table size. The API streams the chunks
+into a StreamingResponse; the CLI writes them to a file or stdout:
+
+    python -m backend.export logs --format csv --gzip --start 2023-01-01 --end 2023-03-31 -o logs.csv.gz
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import aggregates, config, models
+
+settings = config.get_settings()
+
+DATASETS = ("logs", "user_totals", "weekly_totals")
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _user_filter(stmt, user_column, user_ids: Optional[List[int]], emails: Optional[List[str]]):
+    if user_ids:
+        stmt = stmt.where(user_column.in_(user_ids))
+    if emails:
+        stmt = stmt.where(models.User.email.in_([email.lower() for email in emails]))
+    return stmt
+
+
+def build_query(dataset: str, start: Optional[date] = None, end: Optional[date] = None,
+                user_ids: Optional[List[int]] = None, emails: Optional[List[str]] = None):
+    """Column-only SELECT for `dataset`; `start`/`end` are inclusive dates. Raises ValueError on bad input."""
+    if dataset == "logs":
+        log = models.RunningLog
+        stmt = (
+            select(
+                log.id, log.running_datetime, log.step_count, log.distance_km, log.created_at,
+                log.owner_id.label("user_id"), models.User.email, models.User.firstname, models.User.lastname,
+            )
+            .join(models.User, models.User.id == log.owner_id)
+            .order_by(log.id)
+        )
+        if start:
+            stmt = stmt.where(log.running_datetime >= datetime.combine(start, time.min))
+        if end:
+            stmt = stmt.where(log.running_datetime < datetime.combine(end + timedelta(days=1), time.min))
+        return _user_filter(stmt, log.owner_id, user_ids, emails)
+
+    if dataset == "weekly_totals":
+        weekly = models.WeeklyTotals
+        stmt = (
+            select(weekly.week, weekly.owner_id.label("user_id"), models.User.email, weekly.steps, weekly.log_count)
+            .join(models.User, models.User.id == weekly.owner_id)
+            .where(weekly.log_count > 0)
+            .order_by(weekly.week, weekly.owner_id)
+        )
+        # Week labels sort chronologically as strings
+        if start:
+            stmt = stmt.where(weekly.week >= aggregates.week_label(start))
+        if end:
+            stmt = stmt.where(weekly.week <= aggregates.week_label(end))
+        return _user_filter(stmt, weekly.owner_id, user_ids, emails)
+
+    if dataset == "user_totals":
+        if start or end:
+            raise ValueError("Date filters are not supported for user_totals")
+        totals = models.UserTotals
+        stmt = (
+            select(
+                models.User.id.label("user_id"), models.User.email, models.User.firstname, models.User.lastname,
+                func.coalesce(totals.total_steps, 0).label("total_steps"),
+                func.coalesce(totals.total_distance, 0.0).label("total_distance"),
+                func.coalesce(totals.log_count, 0).label("log_count"),
+            )
+            .outerjoin(totals, totals.user_id == models.User.id)
+            .order_by(models.User.id)
+        )
+        return _user_filter(stmt, models.User.id, user_ids, emails)
+
+    raise ValueError(f"Unknown dataset {dataset!r}")
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+class Encoder:
+    """Turns partitions of rows into CSV or NDJSON bytes, gzipped on the fly if asked."""
+
+    def __init__(self, columns: List[str], fmt: str = "csv", gzip: bool = False):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}")
+        self.columns = list(columns)
+        self.fmt = fmt
+        # wbits=31 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(wbits=31) if gzip else None
+
+    def _out(self, text: str) -> bytes:
+        data = text.encode()
+        return self._compressor.compress(data) if self._compressor else data
+
+    def start(self) -> bytes:
+        if self.fmt == "csv":
+            return self._out(self._csv([self.columns]))
+        return b""
+
+    def encode(self, rows) -> bytes:
+        if self.fmt == "csv":
+            return self._out(self._csv([[_plain(value) for value in row] for row in rows]))
+        return self._out("".join(
+            json.dumps(dict(zip(self.columns, (_plain(value) for value in row)))) + "\n" for row in rows
+        ))
+
+    def finish(self) -> bytes:
+        return self._compressor.flush() if self._compressor else b""
+
+    @staticmethod
+    def _csv(rows) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue()
+
+
+def _streaming(stmt):
+    return stmt.execution_options(stream_results=True, yield_per=settings.RUNORG_EXPORT_CHUNK_SIZE)
+
+
+def iter_export(db: Session, stmt, encoder: Encoder):
+    yield encoder.start()
+    for rows in db.execute(_streaming(stmt)).partitions():
+        yield encoder.encode(rows)
+    yield encoder.finish()
+
+
+async def aiter_export(db: AsyncSession, stmt, encoder: Encoder):
+    yield encoder.start()
+    result = await db.stream(_streaming(stmt))
+    async for rows in result.partitions():
+        yield encoder.encode(rows)
+    yield encoder.finish()
+
+
+def filename(dataset: str, fmt: str, gzip: bool) -> str:
+    return f"{dataset}.{fmt}" + (".gz" if gzip else "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export running logs or aggregates as CSV or NDJSON.")
+    parser.add_argument("dataset", choices=DATASETS)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to include (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to include (YYYY-MM-DD)")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids")
+    parser.add_argument("--email", action="append", dest="emails")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        stmt = build_query(args.dataset, args.start, args.end, args.user_ids, args.emails)
+    except ValueError as e:
+        parser.error(str(e))
+    encoder = Encoder([column.name for column in stmt.selected_columns], args.format, args.gzip)
+
+    from .database import SessionLocal
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        with SessionLocal() as db:
+            for chunk in iter_export(db, stmt, encoder):
+                out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
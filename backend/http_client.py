@@ -0,0 +1,70 @@
+"""
+Shared outbound HTTP client.
+
+One httpx.AsyncClient per worker, opened and closed by the app lifespan, so
+OIDC discovery, JWKS and token exchange calls reuse pooled keep-alive
+connections instead of opening a client per call. httpx is imported when the
+client is created, not with the app.
+"""
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from . import config, metrics
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+settings = config.get_settings()
+
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_client(**kwargs) -> "httpx.AsyncClient":
+    import httpx
+
+    http2 = settings.OIDC_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("OIDC_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+    options = dict(
+        http2=http2,
+        timeout=httpx.Timeout(settings.OIDC_HTTP_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=settings.OIDC_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OIDC_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OIDC_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+    if settings.RUNORG_METRICS_ENABLED:
+        options["event_hooks"] = metrics.http_client_event_hooks()
+    options.update(kwargs)
+    return httpx.AsyncClient(**options)
+
+
+def start():
+    global _client
+    if _client is None:
+        _client = create_client()
+
+
+async def close():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """The worker's shared client. Created on first use outside the app lifespan (scripts)."""
+    if _client is None:
+        start()
+    return _client
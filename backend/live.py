@@ -0,0 +1,106 @@
+"""
+Server-sent events fan-out for live stats.
+
+One poller per worker watches the data version and, when it changes, rebuilds
+the snapshot once. If the snapshot differs from the last one it is serialized
+once and the same bytes are queued for every subscriber. Each subscriber has a
+bounded queue; a consumer that falls that far behind is dropped and its stream
+ends, so EventSource reconnects and starts again from the latest snapshot.
+"""
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Optional
+
+from . import async_crud
+
+logger = logging.getLogger(__name__)
+
+
+class LiveHub:
+    def __init__(
+        self,
+        snapshot: Callable[..., Awaitable[dict]],
+        session_factory,
+        poll_interval: float = 1.0,
+        queue_size: int = 16,
+    ):
+        self.snapshot = snapshot
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._version: Optional[int] = None
+        self._data: Optional[dict] = None
+        self._frame: Optional[bytes] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"polls": 0, "broadcasts": 0, "dropped": 0}
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Returns a queue of SSE frames. A None item means the stream is over."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if self._frame is not None:
+            queue.put_nowait(self._frame)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _close(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def publish(self, frame: bytes):
+        self._frame = frame
+        self.stats["broadcasts"] += 1
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+                self._close(queue)
+
+    async def poll_once(self) -> bool:
+        """Publishes a new snapshot if the data changed. Returns whether it did."""
+        self.stats["polls"] += 1
+        async with self.session_factory() as db:
+            version = await async_crud.get_data_version(db)
+            if version == self._version:
+                return False
+            data = await self.snapshot(db)
+        self._version = version
+        # Profile edits and writes outside the top N bump the version without changing the snapshot
+        if data == self._data:
+            return False
+        self._data = data
+        self.publish(f"id: {version}\nevent: snapshot\ndata: {json.dumps(data)}\n\n".encode())
+        return True
+
+    async def _run(self):
+        while self._subscribers:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.error(f"Live stats poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def stop(self):
+        """Ends every open stream and stops polling."""
+        for queue in list(self._subscribers):
+            self._close(queue)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
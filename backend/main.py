@@ -1,25 +1,57 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
 from .config import get_settings
-from .routers import users, stats, auth as auth_router
+from .database import AsyncSessionLocal, AsyncReadSessionLocal
+from .routers import users, stats, admin, auth as auth_router
 from . import auth as auth_utils
+from . import audit, http_client, metrics, querylog, warmup
 
 settings = get_settings()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    http_client.start()
+    if settings.RUNORG_WARMUP_ENABLED:
+        await warmup.warm_up((AsyncSessionLocal, AsyncReadSessionLocal), settings.OIDC_ISSUER)
+    audit.sink.start()
+    stats.snapshot_builder.start()
+    yield
+    await stats.snapshot_builder.stop()
+    # End open live streams so the server can shut down
+    await stats.live_hub.stop()
+    # Flush queued audit entries before the worker exits
+    await run_in_threadpool(audit.sink.stop)
+    await http_client.close()
+
 app = FastAPI(
     title="Run for Organization",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+if settings.RUNORG_QUERY_INSTRUMENTATION:
+    app.add_middleware(querylog.QueryLogMiddleware)
+
+if settings.RUNORG_METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def read_metrics():
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 app.include_router(users.router)
 app.include_router(stats.router)
 app.include_router(auth_router.router)
+app.include_router(admin.router)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Run for Organization API"}
 
 @app.get("/api/config")
-def get_public_config(request: Request):
+async def get_public_config(request: Request):
     callback_url = settings.OIDC_CALLBACK_URL or str(request.url_for("auth_callback"))
     return {
         "start_date": settings.RUNORG_START_DATE,
@@ -30,5 +62,5 @@ def get_public_config(request: Request):
         "oidc_issuer": settings.OIDC_ISSUER,
         "oidc_client_id": settings.OIDC_CLIENT_ID,
         "oidc_callback_url": callback_url,
-        "oidc_login_url": settings.OIDC_AUTH_URL or auth_utils.get_oidc_config_url(settings.OIDC_ISSUER)
+        "oidc_login_url": settings.OIDC_AUTH_URL or await auth_utils.get_oidc_config_url(settings.OIDC_ISSUER)
     }
@@ -0,0 +1,275 @@
+"""
+Prometheus metrics, rendered in the text exposition format without extra dependencies.
+
+Enabled with RUNORG_METRICS_ENABLED. The ASGI middleware records per-route
+latency, status codes and in-flight requests, and reads query count and time
+per request from the request's QueryLog, filled by the same statement listener
+the query log uses; engines built while metrics are enabled
+use a pool that times checkouts; the shared HTTP client times outbound
+(OIDC) calls with httpx event hooks. When disabled none of this is installed.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+from . import config, querylog
+
+settings = config.get_settings()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *label_values) -> int:
+        state = self._values.get(label_values)
+        return state[2] if state else 0
+
+    def sum(self, *label_values) -> float:
+        state = self._values.get(label_values)
+        return state[1] if state else 0.0
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for label_values, (bucket_counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """`collector` runs before each render, to refresh gauges that are sampled rather than tracked."""
+        self._collectors.append(collector)
+
+    def clear(self):
+        for metric in self._metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "runorg_http_requests_total", "HTTP requests by route template and status code.", ("method", "route", "status")
+))
+HTTP_LATENCY = registry.register(Histogram(
+    "runorg_http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "runorg_http_requests_in_flight", "HTTP requests currently being served.", ("method",)
+))
+DB_QUERIES = registry.register(Counter(
+    "runorg_db_queries_total", "SQL statements executed.", ("engine",)
+))
+DB_REQUEST_QUERIES = registry.register(Histogram(
+    "runorg_db_queries_per_request", "SQL statements executed per HTTP request.", ("route",), buckets=QUERY_COUNT_BUCKETS
+))
+DB_REQUEST_QUERY_TIME = registry.register(Histogram(
+    "runorg_db_query_seconds_per_request", "Time spent executing SQL per HTTP request.", ("route",)
+))
+DB_POOL_WAIT = registry.register(Histogram(
+    "runorg_db_pool_checkout_seconds", "Time taken to check a connection out of the pool.", ("engine",)
+))
+DB_POOL_CHECKED_OUT = registry.register(Gauge(
+    "runorg_db_pool_checked_out", "Connections currently checked out of the pool.", ("engine",)
+))
+HTTP_CLIENT_LATENCY = registry.register(Histogram(
+    "runorg_http_client_request_duration_seconds", "Outbound HTTP (OIDC) call latency.", ("host", "method", "status")
+))
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: no per-request task or body buffering, unlike BaseHTTPMiddleware."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method)
+        started = time.perf_counter()
+        with querylog.request_log() as log:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = time.perf_counter() - started
+                HTTP_IN_FLIGHT.dec(method)
+                # The template, not the path, so ids do not explode the label set
+                route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+                HTTP_REQUESTS.inc(method, route, str(status))
+                HTTP_LATENCY.observe(elapsed, method, route)
+                DB_REQUEST_QUERIES.observe(log.count, route)
+                DB_REQUEST_QUERY_TIME.observe(log.seconds, route)
+
+
+def instrument_engine(engine, name: str) -> Callable[[], None]:
+    """
+    Installs the query log's statement listener on `engine` (a sync Engine; pass
+    async_engine.sync_engine), counting its statements, and samples its pool.
+    Do not also call querylog.instrument_engine on it. Returns a function that
+    removes the listener.
+    """
+    remove = querylog.instrument_engine(engine, on_statement=lambda: DB_QUERIES.inc(name))
+
+    def collect_pool():
+        checked_out = getattr(engine.pool, "checkedout", None)
+        if checked_out is not None:
+            DB_POOL_CHECKED_OUT.set(checked_out(), name)
+
+    registry.add_collector(collect_pool)
+    return remove
+
+
+def timed_pool(pool_class, name: str):
+    """Subclass of `pool_class` that records how long each checkout waits for a connection."""
+
+    class TimedPool(pool_class):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                DB_POOL_WAIT.observe(time.perf_counter() - started, name)
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+async def _on_client_request(request):
+    request.extensions["runorg_started"] = time.perf_counter()
+
+
+async def _on_client_response(response):
+    started = response.request.extensions.get("runorg_started")
+    if started is not None:
+        HTTP_CLIENT_LATENCY.observe(
+            time.perf_counter() - started, response.request.url.host, response.request.method, str(response.status_code)
+        )
+
+
+def http_client_event_hooks() -> dict:
+    return {"request": [_on_client_request], "response": [_on_client_response]}
+
+
+def render() -> str:
+    return registry.render()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
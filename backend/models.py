@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from .database import Base
@@ -28,6 +28,13 @@ class RunningLog(Base):
 
     owner = relationship("User", back_populates="logs")
 
+    __table_args__ = (
+        # Keyset pagination of a user's logs
+        Index("ix_running_logs_owner_datetime_id", "owner_id", "running_datetime", "id"),
+        # Organization-wide time series: range scan on running_datetime covering the summed columns
+        Index("ix_running_logs_datetime_steps", "running_datetime", "step_count", "distance_km"),
+    )
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
 
@@ -37,3 +44,41 @@ class AuditLog(Base):
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     user = relationship("User", back_populates="audit_logs")
+
+class UserTotals(Base):
+    __tablename__ = "user_totals"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_steps = Column(Integer, nullable=False, default=0)
+    total_distance = Column(Float, nullable=False, default=0.0)
+    log_count = Column(Integer, nullable=False, default=0)
+
+class OrganizationTotals(Base):
+    __tablename__ = "organization_totals"
+
+    # Single row, see aggregates.ORGANIZATION_ROW_ID
+    id = Column(Integer, primary_key=True)
+    total_steps = Column(Integer, nullable=False, default=0)
+    total_distance = Column(Float, nullable=False, default=0.0)
+    log_count = Column(Integer, nullable=False, default=0)
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+
+    # Single row, bumped by every write that changes what the API returns
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class WeeklyTotals(Base):
+    __tablename__ = "weekly_totals"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # Same "%Y-W%W" label the API has always returned
+    week = Column(String, primary_key=True)
+    steps = Column(Integer, nullable=False, default=0)
+    log_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Covering index for the org-wide series
+        Index("ix_weekly_totals_week", "week", "steps", "log_count"),
+    )
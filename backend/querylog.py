@@ -0,0 +1,156 @@
+"""
+Per-request SQL statement log: query budget, repeated-statement (N+1) detection and Server-Timing.
+
+Enabled with RUNORG_QUERY_INSTRUMENTATION. The middleware gives every request a
+QueryLog through a contextvar; one listener pair per engine appends each
+statement and its duration to it. The metrics middleware reads the same log,
+so with both enabled a statement is still timed once. After the response starts, statements repeated at least
+RUNORG_QUERY_REPEAT_THRESHOLD times with the same shape and requests above
+RUNORG_QUERY_BUDGET statements are logged as warnings, and the response
+carries a Server-Timing header with the database time and statement count.
+"""
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from . import config
+
+logger = logging.getLogger(__name__)
+settings = config.get_settings()
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """`statement` with literals and expanded IN lists collapsed, so one query issued per row looks alike."""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _LITERAL.sub("?", shape)
+    return _PLACEHOLDER_LIST.sub("(?)", shape)
+
+
+class QueryLog:
+    def __init__(self):
+        self.statements: List[Tuple[str, float]] = []
+
+    def record(self, statement: str, seconds: float):
+        self.statements.append((statement, seconds))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def seconds(self) -> float:
+        return sum(seconds for _, seconds in self.statements)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least `threshold` times, most frequent first."""
+        shapes = Counter(statement_shape(statement) for statement, _ in self.statements)
+        return [(shape, n) for shape, n in shapes.most_common() if n >= threshold]
+
+    def report(self, threshold: int = 2) -> str:
+        lines = [f"{self.count} statements, {self.seconds * 1000:.1f} ms"]
+        lines.extend(f"  {n}x {shape}" for shape, n in self.repeated(threshold))
+        return "\n".join(lines)
+
+
+_current: contextvars.ContextVar[Optional[QueryLog]] = contextvars.ContextVar("runorg_query_log", default=None)
+
+
+def current() -> Optional[QueryLog]:
+    """The log of the request being served, if instrumentation is on."""
+    return _current.get()
+
+
+@contextmanager
+def request_log() -> Iterator[QueryLog]:
+    """The current request's log, started here unless an outer middleware already did."""
+    log = _current.get()
+    if log is not None:
+        yield log
+        return
+    log = QueryLog()
+    token = _current.set(log)
+    try:
+        yield log
+    finally:
+        _current.reset(token)
+
+
+def instrument_engine(
+    engine,
+    target: Callable[[], Optional[QueryLog]] = current,
+    on_statement: Optional[Callable[[], None]] = None,
+) -> Callable[[], None]:
+    """
+    Records statements of `engine` (a sync Engine; pass async_engine.sync_engine)
+    into `target()`, by default the current request's log, and calls
+    `on_statement` after each one, in or out of a request. Returns a function
+    that removes the listeners.
+    """
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("runorg_querylog_start", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["runorg_querylog_start"].pop()
+        if on_statement is not None:
+            on_statement()
+        log = target()
+        if log is not None:
+            log.record(statement, elapsed)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    def remove():
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", after_cursor_execute)
+
+    return remove
+
+
+def server_timing(log: QueryLog, app_seconds: float) -> str:
+    return f'db;dur={log.seconds * 1000:.2f};desc="{log.count} queries", app;dur={app_seconds * 1000:.2f}'
+
+
+class QueryLogMiddleware:
+    def __init__(self, app, budget: int = None, repeat_threshold: int = None):
+        self.app = app
+        self.budget = budget if budget is not None else settings.RUNORG_QUERY_BUDGET
+        self.repeat_threshold = repeat_threshold if repeat_threshold is not None else settings.RUNORG_QUERY_REPEAT_THRESHOLD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Shared with the metrics middleware when both are installed
+        with request_log() as log:
+            started = time.perf_counter()
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    # Statements run while a streaming body is sent are logged below but miss the header
+                    MutableHeaders(scope=message).append("Server-Timing", server_timing(log, time.perf_counter() - started))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                self.check(f"{scope['method']} {getattr(scope.get('route'), 'path', scope['path'])}", log)
+
+    def check(self, request: str, log: QueryLog):
+        for shape, n in log.repeated(self.repeat_threshold):
+            logger.warning(f"{request} ran the same statement {n} times (possible N+1): {shape}")
+        if log.count > self.budget:
+            logger.warning(f"{request} ran {log.count} statements, over the budget of {self.budget}")
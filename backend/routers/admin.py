@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date
+
+from .. import export, async_crud
+from ..database import get_async_db, get_read_db
+from ..auth import get_current_admin, Principal
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = "csv",
+    gzip: bool = False,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: Optional[List[int]] = Query(None),
+    email: Optional[List[str]] = Query(None),
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db),
+    write_db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Streams `logs`, `user_totals` or `weekly_totals` as CSV or NDJSON (`format`),
+    gzipped with `gzip=true`. `start`/`end` are inclusive dates; `user_id` and
+    `email` may be repeated. Rows are read on the read engine for as long as the
+    response streams; the audit entry is committed on the write engine first,
+    which releases its connection before streaming starts.
+    """
+    if dataset not in export.DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    try:
+        stmt = export.build_query(dataset, start, end, user_id, email)
+        encoder = export.Encoder([column.name for column in stmt.selected_columns], format, gzip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    await async_crud.create_audit_log(write_db, current_user.id, f"Exported {dataset}")
+    return StreamingResponse(
+        export.aiter_export(db, stmt, encoder),
+        media_type="application/gzip" if gzip else export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{export.filename(dataset, format, gzip)}"'},
+    )
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional, Union
+from datetime import date, datetime, time, timedelta
+import asyncio
 
-from .. import crud, schemas, config
-from ..database import get_db
+from .. import async_crud, schemas, config, conditional, live, snapshot
+from ..database import get_read_db, AsyncReadSessionLocal
 
 router = APIRouter(
     prefix="/api/stats",
@@ -13,36 +16,181 @@ router = APIRouter(
 
 settings = config.get_settings()
 
+# Shared caches may serve stats to anyone for a few seconds, then revalidate with the ETag
+CACHE_CONTROL = f"public, max-age={settings.RUNORG_STATS_CACHE_MAX_AGE_SECONDS}"
+
 @router.get("/progress", response_model=schemas.OrganizationProgress)
-def read_organization_progress(db: Session = Depends(get_db)):
-    return crud.get_organization_stats(db, settings.RUNORG_TOTAL_STEP_GOAL)
+async def read_organization_progress(request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
+    version = await async_crud.get_data_version(db)
+    etag = conditional.make_etag("progress", version, settings.RUNORG_TOTAL_STEP_GOAL)
+    not_modified = conditional.check(request, response, etag, CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    return await async_crud.get_organization_stats(db, settings.RUNORG_TOTAL_STEP_GOAL)
 
 @router.get("/weekly", response_model=List[schemas.WeeklyStats])
-def read_weekly_stats(db: Session = Depends(get_db)):
-    return crud.get_weekly_stats(db)
-
-@router.get("/leaderboard", response_model=List[schemas.LeaderboardEntry])
-def read_leaderboard(db: Session = Depends(get_db)):
-    leaderboard = crud.get_leaderboard(db, settings.RUNORG_TOP_USER)
-    # Mask emails
-    result = []
-    for entry in leaderboard:
-        user = entry["user"]
-        email_parts = user.email.split("@")
-        if len(email_parts) == 2:
-            masked = f"{email_parts[0][:3]}***@{email_parts[1]}"
-        else:
-            masked = user.email
-            
-        result.append({
-            "rank": 0, # Rank assigned in logic or frontend. Let's assign here.
-            "email_masked": masked,
-            "name": f"{user.firstname} {user.lastname}" if user.firstname and user.lastname else None,
-            "steps": entry["steps"]
-        })
-    
-    # Add ranks
-    for i, item in enumerate(result):
-        item["rank"] = i + 1
-        
-    return result
+async def read_weekly_stats(request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
+    version = await async_crud.get_data_version(db)
+    not_modified = conditional.check(request, response, conditional.make_etag("weekly", version), CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    return await async_crud.get_weekly_stats(db)
+
+def event_window(start: Optional[date], end: Optional[date]):
+    """Clamps an inclusive date range to RUNORG_START_DATE..RUNORG_END_DATE; missing bounds default to the event's."""
+    event_start = date.fromisoformat(settings.RUNORG_START_DATE)
+    event_end = date.fromisoformat(settings.RUNORG_END_DATE)
+    return max(start, event_start) if start else event_start, min(end, event_end) if end else event_end
+
+async def step_series(db: AsyncSession, granularity: str, start: Optional[date], end: Optional[date], user_id: int = None):
+    start, end = event_window(start, end)
+    points = []
+    if start <= end:
+        points = await async_crud.get_step_series(
+            db, granularity, datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min), user_id
+        )
+    return {"granularity": granularity, "start": start, "end": end, "points": points}
+
+@router.get("/series", response_model=schemas.StepSeries)
+async def read_step_series(
+    request: Request,
+    response: Response,
+    granularity: Literal["day", "week", "month"] = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Organization steps per day, week (%Y-W%W) or month within the event window. Buckets without logs are omitted."""
+    version = await async_crud.get_data_version(db)
+    etag = conditional.make_etag("series", version, granularity, event_window(start, end))
+    not_modified = conditional.check(request, response, etag, CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    return await step_series(db, granularity, start, end)
+
+@router.get("/leaderboard", response_model=Union[List[schemas.LeaderboardEntry], schemas.LeaderboardPage])
+async def read_leaderboard(
+    request: Request,
+    response: Response,
+    page: Optional[int] = Query(None, ge=1),
+    page_size: int = Query(settings.RUNORG_LEADERBOARD_PAGE_SIZE, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Without `page` this returns the top RUNORG_TOP_USER runners as a plain list.
+    With `page` it returns that page of the full ranking. Tied runners share a rank.
+    """
+    version = await async_crud.get_data_version(db)
+    etag = conditional.make_etag("leaderboard", version, settings.RUNORG_TOP_USER, page, page_size)
+    not_modified = conditional.check(request, response, etag, CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    if page is None:
+        return leaderboard_entries(await async_crud.get_leaderboard(db, settings.RUNORG_TOP_USER))
+
+    total_users = await async_crud.count_users(db)
+    entries = await async_crud.get_leaderboard(db, page_size, offset=(page - 1) * page_size)
+    return {
+        "items": leaderboard_entries(entries),
+        "page": page,
+        "page_size": page_size,
+        "total_users": total_users,
+        "total_pages": -(-total_users // page_size),
+    }
+
+def mask_email(email: str) -> str:
+    email_parts = email.split("@")
+    if len(email_parts) == 2:
+        return f"{email_parts[0][:3]}***@{email_parts[1]}"
+    return email
+
+def leaderboard_entries(leaderboard):
+    return [
+        {
+            "rank": entry["rank"],
+            "email_masked": mask_email(entry["user"].email),
+            "name": f"{entry['user'].firstname} {entry['user'].lastname}" if entry["user"].firstname and entry["user"].lastname else None,
+            "steps": entry["steps"],
+        }
+        for entry in leaderboard
+    ]
+
+async def _live_snapshot(db: AsyncSession):
+    return {
+        "progress": await async_crud.get_organization_stats(db, settings.RUNORG_TOTAL_STEP_GOAL),
+        "leaderboard": leaderboard_entries(await async_crud.get_leaderboard(db, settings.RUNORG_TOP_USER)),
+    }
+
+live_hub = live.LiveHub(
+    _live_snapshot,
+    AsyncReadSessionLocal,
+    poll_interval=settings.RUNORG_LIVE_POLL_INTERVAL_SECONDS,
+    queue_size=settings.RUNORG_LIVE_QUEUE_SIZE,
+)
+
+async def _build_snapshot(db: AsyncSession, version: int, generated_at: datetime) -> bytes:
+    return schemas.StatsSnapshot(
+        generated_at=generated_at,
+        max_staleness_seconds=settings.RUNORG_SNAPSHOT_MAX_STALENESS_SECONDS,
+        version=version,
+        progress=await async_crud.get_organization_stats(db, settings.RUNORG_TOTAL_STEP_GOAL),
+        weekly=await step_series(db, "week", None, None),
+        leaderboard=leaderboard_entries(await async_crud.get_leaderboard(db, settings.RUNORG_TOP_USER)),
+    ).model_dump_json().encode()
+
+snapshot_builder = snapshot.SnapshotBuilder(
+    _build_snapshot,
+    AsyncReadSessionLocal,
+    interval=settings.RUNORG_SNAPSHOT_INTERVAL_SECONDS,
+    poll_interval=settings.RUNORG_SNAPSHOT_POLL_SECONDS,
+    max_staleness=settings.RUNORG_SNAPSHOT_MAX_STALENESS_SECONDS,
+)
+
+@router.get("/snapshot", response_model=schemas.StatsSnapshot)
+async def read_stats_snapshot(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """
+    Progress, the event-window weekly series and the top-N leaderboard in one
+    precomputed body. Served from memory; the session is only used if the
+    snapshot has to be rebuilt inline. `generated_at` is when the body was
+    built; the X-Snapshot-Verified-At header is when it was last confirmed
+    current, the time max_staleness_seconds bounds.
+    """
+    current = await snapshot_builder.get(db)
+    headers = {
+        "ETag": current.etag,
+        "Cache-Control": CACHE_CONTROL,
+        "X-Snapshot-Verified-At": snapshot_builder.verified_at.isoformat(),
+    }
+    if conditional.etag_matches(request, current.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(current.body, media_type="application/json", headers=headers)
+
+@router.get("/live")
+async def stream_live_stats(request: Request):
+    """
+    Server-sent events: a `snapshot` event with {"progress", "leaderboard"} on
+    connect and whenever either changes, plus periodic keepalive comments.
+    """
+    async def events():
+        queue = live_hub.subscribe()
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=settings.RUNORG_LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keepalive\n\n"
+                    continue
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            live_hub.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must neither cache nor buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional, Union
+from datetime import date, datetime
+import base64
+import json
+import logging
 
-from .. import crud, models, schemas, config
-from ..database import get_db
-from ..auth import get_current_user
+from .. import async_crud, models, schemas, config, conditional
+from ..database import AsyncSessionLocal, get_async_db, get_read_db
+from ..auth import get_current_user, principal_cache, Principal
+from .stats import leaderboard_entries, event_window, step_series
 
 router = APIRouter(
     prefix="/api/me",
@@ -12,60 +19,134 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+logger = logging.getLogger(__name__)
 settings = config.get_settings()
 
+def _derive_metrics(step_count: Optional[int], distance_km: Optional[float]):
+    """Fills in whichever of step_count/distance_km is missing. Returns None if both are."""
+    if step_count is None and distance_km is None:
+        return None
+    if step_count is None:
+        step_count = int(distance_km * settings.RUNORG_STEP_PER_KM)
+    if distance_km is None:
+        distance_km = step_count / settings.RUNORG_STEP_PER_KM
+    return step_count, distance_km
+
 @router.get("", response_model=schemas.UserStats)
-def read_user_me(
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def read_user_me(
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    stats = crud.get_user_stats(db, current_user.id)
-    return {
-        "email": current_user.email,
-        "firstname": current_user.firstname,
-        "lastname": current_user.lastname,
-        "total_steps": stats["total_steps"],
-        "total_distance": stats["total_distance"]
-    }
+    version = await async_crud.get_data_version(db)
+    # Per-user data: only the browser may cache it, and must revalidate every time
+    etag = conditional.make_etag("me", current_user.id, version)
+    not_modified = conditional.check(request, response, etag, "private, no-cache")
+    if not_modified:
+        return not_modified
+    # Names come from the database: cached principals of other workers may predate a profile update
+    summary = await async_crud.get_user_summary(db, current_user.id)
+    if summary is None:
+        # A replica may not have the user get_current_user just created yet; only then is the write engine used
+        async with AsyncSessionLocal() as write_db:
+            summary = await async_crud.get_user_summary(write_db, current_user.id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return summary
 
 @router.put("", response_model=schemas.User)
-def update_user_me(
+async def update_user_me(
     user_update: schemas.UserUpdate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    updated_user = crud.update_user(db, current_user, user_update)
-    crud.create_audit_log(db, user_id=current_user.id, message="Updated user profile")
+    user = await async_crud.get_user(db, current_user.id)
+    updated_user = await async_crud.update_user(db, user, user_update)
+    # The response includes the logs relationship, which cannot lazy load in async code
+    await db.refresh(updated_user, ["logs"])
+    # Cached principals still carry the old names
+    principal_cache.invalidate_user(current_user.id)
     return updated_user
 
-@router.get("/logs", response_model=List[schemas.RunningLog])
-def read_running_logs(
-    skip: int = 0, 
+@router.get("/rank", response_model=schemas.UserRank)
+async def read_user_rank(
+    request: Request,
+    response: Response,
+    around: int = Query(settings.RUNORG_RANK_WINDOW, ge=0, le=50),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """The caller's rank (as on the leaderboard), percentile and the `around` entries above and below."""
+    version = await async_crud.get_data_version(db)
+    etag = conditional.make_etag("rank", current_user.id, version, around)
+    not_modified = conditional.check(request, response, etag, "private, no-cache")
+    if not_modified:
+        return not_modified
+    rank = await async_crud.get_user_rank(db, current_user.id, around)
+    if rank is None:
+        # Not replicated yet, see read_user_me
+        async with AsyncSessionLocal() as write_db:
+            rank = await async_crud.get_user_rank(write_db, current_user.id, around)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    entries = leaderboard_entries(rank["around"])
+    for entry, row in zip(entries, rank["around"]):
+        entry["is_me"] = row["user"].id == current_user.id
+    return {**rank, "around": entries}
+
+def _encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["running_datetime"].isoformat(), row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        running_datetime, log_id = json.loads(raw)
+        return datetime.fromisoformat(running_datetime), int(log_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+MAX_LOG_PAGE_SIZE = 1000
+
+@router.get("/logs", response_model=Union[List[schemas.RunningLog], schemas.RunningLogPage])
+async def read_running_logs(
+    skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    logs = crud.get_running_logs(db, user_id=current_user.id, skip=skip, limit=limit)
-    return logs
+    """
+    Without `cursor` this returns a plain list paginated by skip/limit.
+    Pass `cursor=` (empty) for the first page in cursor mode, then the returned `next_cursor`;
+    there `limit` must be 1..MAX_LOG_PAGE_SIZE.
+    Rows are serialized straight to JSON, response_model only documents the shape.
+    """
+    if cursor is None:
+        rows = await async_crud.get_running_log_rows(db, user_id=current_user.id, skip=skip, limit=limit)
+        return Response(schemas.running_log_rows.dump_json(rows), media_type="application/json")
+
+    # A zero limit would hand out a cursor past a row it never returned
+    if not 1 <= limit <= MAX_LOG_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail=f"limit must be between 1 and {MAX_LOG_PAGE_SIZE} with a cursor")
+    after = _decode_cursor(cursor) if cursor else None
+    rows = await async_crud.get_running_log_rows(db, user_id=current_user.id, limit=limit + 1, after=after)
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    page = {"items": rows[:limit], "next_cursor": next_cursor}
+    return Response(schemas.running_log_row_page.dump_json(page), media_type="application/json")
 
 @router.post("/logs", response_model=schemas.RunningLog)
-def create_running_log(
+async def create_running_log(
     log: schemas.RunningLogCreate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Auto calculation logic
-    step_count = log.step_count
-    distance_km = log.distance_km
-    
-    if step_count is None and distance_km is None:
+    metrics = _derive_metrics(log.step_count, log.distance_km)
+    if metrics is None:
         raise HTTPException(status_code=400, detail="Either step_count or distance_km must be provided")
-        
-    if step_count is None:
-        step_count = int(distance_km * settings.RUNORG_STEP_PER_KM)
-        
-    if distance_km is None:
-        distance_km = step_count / settings.RUNORG_STEP_PER_KM
+    step_count, distance_km = metrics
 
     db_log = models.RunningLog(
         owner_id=current_user.id,
@@ -73,60 +154,179 @@ def create_running_log(
         step_count=step_count,
         distance_km=distance_km
     )
-    created_log = crud.create_running_log(db, log=db_log, user_id=current_user.id)
-    crud.create_audit_log(db, user_id=current_user.id, message=f"Created log id {created_log.id}")
+    created_log = await async_crud.create_running_log(db, log=db_log, user_id=current_user.id)
     return created_log
 
+class _ImportLimitExceeded(Exception):
+    pass
+
+async def _iter_bulk_rows(request: Request):
+    """
+    Yields decoded rows from a JSON array body or a streamed NDJSON body. A JSON
+    array over RUNORG_BULK_MAX_JSON_BYTES is rejected with 413 before any row is
+    read; an NDJSON body raises _ImportLimitExceeded once it passes
+    RUNORG_BULK_MAX_BODY_BYTES.
+    """
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    max_bytes = settings.RUNORG_BULK_MAX_BODY_BYTES if ndjson else settings.RUNORG_BULK_MAX_JSON_BYTES
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Import body is over {max_bytes} bytes" + ("" if ndjson else ", send large imports as NDJSON"),
+    )
+    if int(request.headers.get("content-length") or 0) > max_bytes:
+        raise too_large
+
+    if not ndjson:
+        # Parsed whole, so the size cap keeps a single copy of the body small
+        body = bytearray()
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > max_bytes:
+                raise too_large
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        for row in rows:
+            yield row
+        return
+
+    received = 0
+    buffer = b""
+    async for chunk in request.stream():
+        # Lines complete within the cap are still imported
+        buffer += chunk[:max_bytes - received]
+        received += len(chunk)
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+        if received > max_bytes:
+            raise _ImportLimitExceeded(f"Import body size limit of {max_bytes} bytes exceeded")
+    if buffer.strip():
+        yield buffer
+
+@router.post("/logs/bulk", response_model=schemas.BulkImportResult)
+async def bulk_create_running_logs(
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Imports many logs at once from a JSON array or an NDJSON stream
+    (Content-Type: application/x-ndjson). Valid rows are inserted in chunks of
+    RUNORG_BULK_CHUNK_SIZE, each chunk in its own transaction. Reading stops at
+    RUNORG_BULK_MAX_ROWS rows or RUNORG_BULK_MAX_BODY_BYTES; rows read before
+    that are stored and a single error result marks where the import stopped.
+    """
+    results = []
+    pending = []
+
+    async def flush():
+        logs = [log for _, log in pending]
+        try:
+            ids = await async_crud.bulk_create_running_logs(db, logs)
+            results.extend(schemas.BulkImportRow(index=index, id=log_id) for (index, _), log_id in zip(pending, ids))
+        except SQLAlchemyError as e:
+            logger.error(f"Bulk import chunk failed: {e}")
+            await db.rollback()
+            results.extend(schemas.BulkImportRow(index=index, error="Failed to store row") for index, _ in pending)
+        pending.clear()
+
+    index = 0
+    try:
+        async for raw in _iter_bulk_rows(request):
+            if index >= settings.RUNORG_BULK_MAX_ROWS:
+                results.append(schemas.BulkImportRow(index=index, error=f"Import row limit of {settings.RUNORG_BULK_MAX_ROWS} exceeded"))
+                break
+            try:
+                row = json.loads(raw) if isinstance(raw, bytes) else raw
+                log = schemas.RunningLogCreate.model_validate(row)
+            except (ValueError, ValidationError) as e:
+                error = e.errors()[0]["msg"] if isinstance(e, ValidationError) else "Invalid JSON"
+                results.append(schemas.BulkImportRow(index=index, error=error))
+                index += 1
+                continue
+
+            metrics = _derive_metrics(log.step_count, log.distance_km)
+            if metrics is None:
+                results.append(schemas.BulkImportRow(index=index, error="Either step_count or distance_km must be provided"))
+            else:
+                step_count, distance_km = metrics
+                pending.append((index, models.RunningLog(
+                    owner_id=current_user.id,
+                    running_datetime=log.running_datetime,
+                    step_count=step_count,
+                    distance_km=distance_km
+                )))
+                if len(pending) >= settings.RUNORG_BULK_CHUNK_SIZE:
+                    await flush()
+            index += 1
+    except _ImportLimitExceeded as e:
+        results.append(schemas.BulkImportRow(index=index, error=str(e)))
+
+    if pending:
+        await flush()
+
+    results.sort(key=lambda row: row.index)
+    created = sum(1 for row in results if row.error is None)
+    failed = len(results) - created
+    await async_crud.create_audit_log(db, current_user.id, f"Bulk imported {created} logs ({failed} rejected)")
+    return {"created": created, "failed": failed, "results": results}
+
 @router.put("/logs/{log_id}", response_model=schemas.RunningLog)
-def update_running_log(
+async def update_running_log(
     log_id: int,
     log_update: schemas.RunningLogUpdate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_log = crud.get_running_log(db, log_id, current_user.id)
+    db_log = await async_crud.get_running_log(db, log_id, current_user.id)
     if db_log is None:
         raise HTTPException(status_code=404, detail="Log not found")
 
-    step_count = log_update.step_count
-    distance_km = log_update.distance_km
-
-    if step_count is None and distance_km is None:
+    metrics = _derive_metrics(log_update.step_count, log_update.distance_km)
+    if metrics is None:
          raise HTTPException(status_code=400, detail="Either step_count or distance_km must be provided for update")
+    step_count, distance_km = metrics
 
-    if step_count is not None and distance_km is None:
-         distance_km = step_count / settings.RUNORG_STEP_PER_KM
-    elif distance_km is not None and step_count is None:
-         step_count = int(distance_km * settings.RUNORG_STEP_PER_KM)
-         
-    # Update fields
-    if step_count is not None:
-        db_log.step_count = step_count
-    if distance_km is not None:
-        db_log.distance_km = distance_km
-    if log_update.running_datetime:
-        db_log.running_datetime = log_update.running_datetime
-        
-    db.commit()
-    db.refresh(db_log)
-    crud.create_audit_log(db, user_id=current_user.id, message=f"Updated log id {db_log.id}")
+    db_log = await async_crud.update_running_log(db, db_log, step_count, distance_km, log_update.running_datetime)
     return db_log
 
 @router.delete("/logs/{log_id}", response_model=schemas.RunningLog)
-def delete_running_log(
+async def delete_running_log(
     log_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_log = crud.delete_running_log(db, log_id, current_user.id)
+    db_log = await async_crud.delete_running_log(db, log_id, current_user.id)
     if db_log is None:
         raise HTTPException(status_code=404, detail="Log not found")
-    crud.create_audit_log(db, user_id=current_user.id, message=f"Deleted log id {log_id}")
     return db_log
 
+@router.get("/series", response_model=schemas.StepSeries)
+async def read_user_step_series(
+    request: Request,
+    response: Response,
+    granularity: Literal["day", "week", "month"] = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """The caller's steps per day, week (%Y-W%W) or month within the event window."""
+    version = await async_crud.get_data_version(db)
+    etag = conditional.make_etag("me-series", current_user.id, version, granularity, event_window(start, end))
+    not_modified = conditional.check(request, response, etag, "private, no-cache")
+    if not_modified:
+        return not_modified
+    return await step_series(db, granularity, start, end, current_user.id)
+
 @router.get("/weekly", response_model=List[schemas.WeeklyStats])
-def read_user_weekly_stats(
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def read_user_weekly_stats(
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    return crud.get_user_weekly_stats(db, current_user.id)
+    return await async_crud.get_user_weekly_stats(db, current_user.id)
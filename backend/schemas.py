@@ -1,6 +1,7 @@
-from pydantic import BaseModel, ConfigDict
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from datetime import date, datetime
 from typing import Optional, List
+from typing_extensions import TypedDict
 
 class RunningLogBase(BaseModel):
     running_datetime: datetime
@@ -22,6 +23,37 @@ class RunningLog(RunningLogBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class RunningLogPage(BaseModel):
+    items: List[RunningLog]
+    next_cursor: Optional[str] = None
+
+class RunningLogRow(TypedDict):
+    """RunningLog as a plain dict (crud.get_running_log_rows)."""
+    running_datetime: datetime
+    step_count: int
+    distance_km: float
+    id: int
+    owner_id: int
+    created_at: datetime
+
+class RunningLogRowPage(TypedDict):
+    items: List[RunningLogRow]
+    next_cursor: Optional[str]
+
+# Serialize rows to the same JSON as RunningLog/RunningLogPage, without building or validating models
+running_log_rows = TypeAdapter(List[RunningLogRow])
+running_log_row_page = TypeAdapter(RunningLogRowPage)
+
+class BulkImportRow(BaseModel):
+    index: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkImportResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkImportRow]
+
 class UserBase(BaseModel):
     email: str
     firstname: Optional[str] = None
@@ -49,13 +81,50 @@ class WeeklyStats(BaseModel):
     week: str
     steps: int
 
+class SeriesPoint(BaseModel):
+    period: str
+    steps: int
+    distance_km: float
+    log_count: int
+
+class StepSeries(BaseModel):
+    granularity: str
+    start: date
+    end: date
+    points: List[SeriesPoint]
+
 class LeaderboardEntry(BaseModel):
     rank: int
     email_masked: str
     name: Optional[str] = None
     steps: int
 
+class LeaderboardPage(BaseModel):
+    items: List[LeaderboardEntry]
+    page: int
+    page_size: int
+    total_users: int
+    total_pages: int
+
+class RankWindowEntry(LeaderboardEntry):
+    is_me: bool = False
+
+class UserRank(BaseModel):
+    rank: int
+    steps: int
+    total_users: int
+    percentile: float
+    around: List[RankWindowEntry]
+
 class OrganizationProgress(BaseModel):
     percentage: float
     total_steps: int
     goal: int
+
+class StatsSnapshot(BaseModel):
+    generated_at: datetime
+    max_staleness_seconds: float
+    version: int
+    progress: OrganizationProgress
+    weekly: StepSeries
+    leaderboard: List[LeaderboardEntry]
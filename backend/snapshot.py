@@ -0,0 +1,128 @@
+"""
+Precomputed, pre-serialized stats snapshot rebuilt in the background.
+
+A task started by the app lifespan checks the data version every
+`poll_interval` seconds and rebuilds the snapshot when it changed, or every
+`interval` seconds regardless. A snapshot is immutable: a rebuild creates a new
+one and swaps the reference, so requests always see a complete body.
+
+The staleness bound `max_staleness` caps how long ago the served snapshot was
+last confirmed current, not how old it is: a snapshot whose data has not
+changed keeps its `generated_at` and is re-confirmed, and `verified_at` holds
+the wall-clock time of that confirmation for the route to expose. If the
+background task falls behind (or has not run yet), the next request rebuilds
+it inline, once, under a lock.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+from . import async_crud, conditional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    body: bytes
+    etag: str
+    version: int
+    generated_at: datetime
+    built_at: float  # clock() when built
+
+
+class SnapshotBuilder:
+    def __init__(
+        self,
+        build: Callable[..., Awaitable[bytes]],
+        session_factory,
+        interval: float = 60.0,
+        poll_interval: float = 1.0,
+        max_staleness: float = 10.0,
+        clock=time.monotonic,
+    ):
+        """`build(db, version, generated_at)` returns the serialized snapshot."""
+        self.build = build
+        self.session_factory = session_factory
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self.max_staleness = max_staleness
+        self._clock = clock
+        self._current: Optional[Snapshot] = None
+        self._verified_at = 0.0
+        self._verified_wall: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"builds": 0, "inline_builds": 0, "errors": 0}
+
+    @property
+    def current(self) -> Optional[Snapshot]:
+        return self._current
+
+    @property
+    def verified_at(self) -> Optional[datetime]:
+        """When the current snapshot was last confirmed to match the data version."""
+        return self._verified_wall
+
+    async def refresh(self, db, force: bool = False) -> bool:
+        """Rebuilds if the data changed, the snapshot is older than `interval` or `force`. Returns whether it did."""
+        version = await async_crud.get_data_version(db)
+        current = self._current
+        now = self._clock()
+        if not force and current is not None and current.version == version and now - current.built_at < self.interval:
+            self._verified_at = now
+            self._verified_wall = datetime.now(timezone.utc)
+            return False
+
+        generated_at = datetime.now(timezone.utc)
+        body = await self.build(db, version, generated_at)
+        self._current = Snapshot(
+            body=body,
+            etag=conditional.make_etag("snapshot", version, generated_at.isoformat()),
+            version=version,
+            generated_at=generated_at,
+            built_at=now,
+        )
+        self._verified_at = now
+        self._verified_wall = generated_at
+        self.stats["builds"] += 1
+        return True
+
+    def _fresh(self) -> bool:
+        return self._current is not None and self._clock() - self._verified_at <= self.max_staleness
+
+    async def get(self, db) -> Snapshot:
+        """The current snapshot, refreshed through `db` first if it is missing or beyond the staleness bound."""
+        if not self._fresh():
+            async with self._lock:
+                if not self._fresh():
+                    self.stats["inline_builds"] += 1
+                    await self.refresh(db)
+        return self._current
+
+    async def _run(self):
+        while True:
+            try:
+                async with self._lock:
+                    async with self.session_factory() as db:
+                        await self.refresh(db)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Stats snapshot refresh failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
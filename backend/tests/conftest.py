@@ -1,23 +1,64 @@
+import os
+import tempfile
+from contextlib import contextmanager
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 from backend.main import app
-from backend.database import Base, get_db
+from backend.database import Base, get_async_db, get_read_db, read_only_url
 from backend.config import get_settings
 from backend import models # Import models to register them with Base.metadata
+from backend import auth, main, querylog
+from backend.routers import stats, users
 
-# Use in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# A temporary SQLite file, so the synchronous fixture session and the async
+# engine used by the app see the same database
+TEST_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="runorg-tests-"), "test.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{TEST_DB_PATH}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool
+    poolclass=NullPool
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{TEST_DB_PATH}", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Read routes get a read-only connection to the same file, as in production
+read_engine = create_async_engine(read_only_url(f"sqlite+aiosqlite:///{TEST_DB_PATH}"), poolclass=NullPool)
+TestingAsyncReadSessionLocal = async_sessionmaker(read_engine, autoflush=False, expire_on_commit=False)
+
+TEST_ENGINES = (engine, async_engine.sync_engine, read_engine.sync_engine)
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    auth.reset_oidc_caches()
+    auth.principal_cache.clear()
+    yield
+    auth.reset_oidc_caches()
+    auth.principal_cache.clear()
+
+@pytest.fixture(autouse=True)
+def isolate_lifespan(monkeypatch):
+    """
+    Keeps the app lifespan, run by every TestClient(app), off the app's own
+    engines, which would create ./sql_app.db.
+    """
+    # Warm-up primes the app's own engines, not the test database
+    monkeypatch.setattr(main.settings, "RUNORG_WARMUP_ENABLED", False)
+    # Its periodic refresh would race query counters and drop_all; snapshot tests build their own
+    monkeypatch.setattr(stats.snapshot_builder, "start", lambda: None)
+    # Background work opens its own sessions
+    monkeypatch.setattr(stats.snapshot_builder, "session_factory", TestingAsyncReadSessionLocal)
+    monkeypatch.setattr(stats.live_hub, "session_factory", TestingAsyncReadSessionLocal)
+    # Replica-lag fallbacks open write sessions directly
+    monkeypatch.setattr(users, "AsyncSessionLocal", TestingAsyncSessionLocal)
+
 @pytest.fixture(scope="function")
 def db_session():
     Base.metadata.create_all(bind=engine)
@@ -28,14 +69,58 @@ def db_session():
         db.close()
         Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(scope="function")
+def async_session_factory(db_session):
+    """Async sessions on the test database, for code that opens its own sessions."""
+    return TestingAsyncSessionLocal
+
 @pytest.fixture(scope="function")
 def client(db_session):
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            pass
-    
-    app.dependency_overrides[get_db] = override_get_db
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    async def override_get_read_db():
+        async with TestingAsyncReadSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_read_db] = override_get_read_db
     with TestClient(app) as c:
         yield c
+    app.dependency_overrides.clear()
+
+@pytest.fixture(scope="function")
+def query_counter():
+    """Collects every SQL statement executed on the test engines."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for target in TEST_ENGINES:
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for target in TEST_ENGINES:
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+@pytest.fixture(scope="function")
+def query_budget():
+    """
+    `with query_budget(n): ...` fails if the block runs more than n statements on
+    the test engines. The failure lists statements repeated with the same shape.
+    """
+    @contextmanager
+    def budget(limit):
+        log = querylog.QueryLog()
+        removers = [querylog.instrument_engine(target, lambda: log) for target in TEST_ENGINES]
+        try:
+            yield log
+        finally:
+            for remove in removers:
+                remove()
+        assert log.count <= limit, f"Query budget of {limit} exceeded: {log.report()}"
+
+    return budget
@@ -0,0 +1,148 @@
+from datetime import datetime
+from backend import models, crud, aggregates
+from backend.main import app
+from backend.auth import get_current_user
+
+
+def _make_user(db_session, email="agg@example.com"):
+    user = models.User(email=email)
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    return user
+
+
+def test_user_totals_follow_create_update_delete(client, db_session):
+    user = _make_user(db_session)
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    first = client.post("/api/me/logs", json={"running_datetime": "2023-01-02T10:00:00", "step_count": 1500}).json()
+    client.post("/api/me/logs", json={"running_datetime": "2023-01-03T10:00:00", "distance_km": 2.0})
+    totals = db_session.get(models.UserTotals, user.id)
+    assert (totals.total_steps, totals.total_distance, totals.log_count) == (4500, 3.0, 2)
+
+    client.put(f"/api/me/logs/{first['id']}", json={"running_datetime": "2023-01-02T10:00:00", "step_count": 300})
+    db_session.refresh(totals)
+    assert (totals.total_steps, totals.log_count) == (3300, 2)
+
+    client.delete(f"/api/me/logs/{first['id']}")
+    db_session.refresh(totals)
+    assert (totals.total_steps, totals.total_distance, totals.log_count) == (3000, 2.0, 1)
+
+    assert client.get("/api/me").json()["total_steps"] == 3000
+    assert aggregates.rebuild_user_totals(db_session, dry_run=True) == []
+
+
+def test_rebuild_user_totals_reports_and_fixes_drift(db_session):
+    user = _make_user(db_session)
+    crud.create_running_log(db_session, models.RunningLog(
+        owner_id=user.id, running_datetime=datetime(2023, 1, 2), step_count=1000, distance_km=1.0
+    ), user_id=user.id)
+    # Simulate a write that bypassed the aggregates
+    db_session.add(models.RunningLog(owner_id=user.id, running_datetime=datetime(2023, 1, 3), step_count=500, distance_km=0.5))
+    db_session.commit()
+
+    drift = aggregates.rebuild_user_totals(db_session)
+    assert len(drift) == 1
+    assert drift[0]["key"] == user.id
+    assert drift[0]["expected"]["total_steps"] == 1500
+    assert drift[0]["actual"]["total_steps"] == 1000
+
+    assert crud.get_user_stats(db_session, user.id) == {"total_steps": 1500, "total_distance": 1.5}
+    assert aggregates.rebuild_user_totals(db_session, dry_run=True) == []
+
+
+def _naive_weekly(logs):
+    weekly = {}
+    for log in logs:
+        week = log.running_datetime.strftime("%Y-W%W")
+        weekly[week] = weekly.get(week, 0) + log.step_count
+    return [{"week": k, "steps": v} for k, v in sorted(weekly.items())]
+
+
+def test_weekly_rollup_matches_raw_logs(client, db_session):
+    user = _make_user(db_session)
+    other = _make_user(db_session, email="other@example.com")
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    ids = []
+    for day, steps in [("2023-01-01", 100), ("2023-01-02", 200), ("2023-01-09", 400), ("2023-12-31", 800)]:
+        ids.append(client.post("/api/me/logs", json={"running_datetime": f"{day}T08:00:00", "step_count": steps}).json()["id"])
+    crud.create_running_log(db_session, models.RunningLog(
+        owner_id=other.id, running_datetime=datetime(2023, 1, 3), step_count=50, distance_km=0.1
+    ), user_id=other.id)
+
+    # Move a log to another week, then empty a week completely
+    client.put(f"/api/me/logs/{ids[1]}", json={"running_datetime": "2023-01-10T08:00:00", "step_count": 250})
+    client.delete(f"/api/me/logs/{ids[0]}")
+
+    logs = db_session.query(models.RunningLog).all()
+    assert client.get("/api/stats/weekly").json() == _naive_weekly(logs)
+    assert client.get("/api/me/weekly").json() == _naive_weekly([l for l in logs if l.owner_id == user.id])
+    assert [w["week"] for w in client.get("/api/me/weekly").json()] == ["2023-W02", "2023-W52"]
+    assert aggregates.rebuild_weekly_totals(db_session, dry_run=True) == []
+
+
+def test_rebuild_weekly_totals_reports_drift(db_session):
+    user = _make_user(db_session)
+    db_session.add(models.RunningLog(owner_id=user.id, running_datetime=datetime(2023, 2, 1), step_count=700, distance_km=0.5))
+    db_session.commit()
+
+    drift = aggregates.rebuild_weekly_totals(db_session)
+    assert drift == [{
+        "key": (user.id, "2023-W05"),
+        "expected": {"steps": 700, "log_count": 1},
+        "actual": {"steps": 0, "log_count": 0},
+    }]
+    assert crud.get_user_weekly_stats(db_session, user.id) == [{"week": "2023-W05", "steps": 700}]
+
+
+def test_organization_progress_reads_counter(client, db_session, query_counter):
+    user = _make_user(db_session)
+    app.dependency_overrides[get_current_user] = lambda: user
+    client.post("/api/me/logs", json={"running_datetime": "2023-01-02T10:00:00", "step_count": 250000})
+    log_id = client.post("/api/me/logs", json={"running_datetime": "2023-01-03T10:00:00", "step_count": 10}).json()["id"]
+    client.delete(f"/api/me/logs/{log_id}")
+
+    query_counter.clear()
+    data = client.get("/api/stats/progress").json()
+    assert data["total_steps"] == 250000
+    assert data["percentage"] == (250000 / data["goal"]) * 100
+    # The data version for the ETag, then the counter row
+    assert len(query_counter) == 2
+    assert "data_version" in query_counter[0]
+    assert "running_logs" not in query_counter[1]
+    assert aggregates.rebuild_organization_totals(db_session, dry_run=True) == []
+
+
+def test_concurrent_log_writes_do_not_lose_updates(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from backend.database import Base
+
+    file_engine = create_engine(f"sqlite:///{tmp_path}/concurrency.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=file_engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=file_engine)
+
+    with Session() as db:
+        users = [models.User(email=f"writer{i}@example.com") for i in range(4)]
+        db.add_all(users)
+        db.commit()
+        user_ids = [u.id for u in users]
+
+    def write_logs(user_id):
+        with Session() as db:
+            for i in range(25):
+                crud.create_running_log(db, models.RunningLog(
+                    owner_id=user_id, running_datetime=datetime(2023, 3, 1 + i), step_count=10, distance_km=0.01
+                ), user_id=user_id)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(write_logs, user_ids))
+
+    with Session() as db:
+        assert crud.get_organization_stats(db, 1000)["total_steps"] == 4 * 25 * 10
+        assert aggregates.rebuild_organization_totals(db, dry_run=True) == []
+        assert aggregates.rebuild_user_totals(db, dry_run=True) == []
+    file_engine.dispose()
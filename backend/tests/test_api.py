@@ -168,3 +168,251 @@ def test_user_profile_update(client, db_session):
              break
     assert found
 
+
+def test_me_conditional_get(client, db_session):
+    from backend import models
+    from backend.auth import get_current_user
+
+    user = models.User(email="etag@example.com")
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    response = client.get("/api/me")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+    assert client.get("/api/me", headers={"If-None-Match": etag}).status_code == 304
+
+    # Profile updates and log writes both change the representation
+    client.put("/api/me", json={"firstname": "Etag"})
+    response = client.get("/api/me", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["firstname"] == "Etag"
+    etag = response.headers["etag"]
+
+    client.post("/api/me/logs", json={"running_datetime": "2023-01-01T10:00:00", "step_count": 100})
+    response = client.get("/api/me", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["total_steps"] == 100
+
+def test_me_query_budget(client, db_session, query_budget):
+    from backend import models
+    from backend.auth import get_current_user
+
+    user = models.User(email="budget@example.com")
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    for day in range(1, 6):
+        client.post("/api/me/logs", json={"running_datetime": f"2023-01-0{day}T10:00:00", "step_count": 100})
+
+    with query_budget(2):
+        assert client.get("/api/me").status_code == 200
+    with query_budget(1):
+        assert len(client.get("/api/me/logs").json()) == 5
+    with query_budget(1):
+        client.get("/api/me/weekly")
+    # Insert, three aggregate upserts, the data version, the audit row and the refresh
+    with query_budget(7):
+        client.post("/api/me/logs", json={"running_datetime": "2023-01-06T10:00:00", "step_count": 100})
+
+def test_running_logs_cursor_pagination(client, db_session):
+    from backend import models
+    from backend.auth import get_current_user
+
+    user = models.User(email="pager@example.com")
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    # Two logs share a timestamp so the id tie-breaker matters
+    for day in ["2023-01-03", "2023-01-01", "2023-01-02", "2023-01-02", "2023-01-05"]:
+        client.post("/api/me/logs", json={"running_datetime": f"{day}T10:00:00", "step_count": 100})
+
+    legacy = client.get("/api/me/logs?skip=1&limit=2")
+    assert isinstance(legacy.json(), list)
+    assert len(legacy.json()) == 2
+
+    seen = []
+    cursor = ""
+    while True:
+        page = client.get("/api/me/logs", params={"cursor": cursor, "limit": 2}).json()
+        seen.extend((log["running_datetime"], log["id"]) for log in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+    assert [log["id"] for log in client.get("/api/me/logs").json()] == [id_ for _, id_ in seen]
+
+    response = client.get("/api/me/logs", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    # A zero limit would hand out a cursor past a row it never returned
+    for params in ({"cursor": "", "limit": 0}, {"cursor": "", "limit": 1001}):
+        assert client.get("/api/me/logs", params=params).status_code == 422
+    # skip/limit mode keeps accepting what it always did
+    assert client.get("/api/me/logs", params={"limit": 0}).json() == []
+    assert len(client.get("/api/me/logs", params={"limit": 1001}).json()) == 5
+
+def test_running_log_rows_serialize_like_the_model(client, db_session, query_counter):
+    from typing import List
+    from pydantic import TypeAdapter
+    from backend import crud, models, schemas
+    from backend.auth import get_current_user, Principal
+
+    user = models.User(email="rows@example.com")
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    app.dependency_overrides[get_current_user] = lambda: Principal.from_user(user)
+    for day in ["2023-01-02", "2023-01-01"]:
+        client.post("/api/me/logs", json={"running_datetime": f"{day}T10:00:00", "distance_km": 2.5})
+
+    query_counter.clear()
+    response = client.get("/api/me/logs")
+    assert response.headers["content-type"] == "application/json"
+    assert [s for s in query_counter if "running_logs" in s][0].startswith(
+        "SELECT running_logs.running_datetime, running_logs.step_count, running_logs.distance_km, "
+        "running_logs.id, running_logs.owner_id, running_logs.created_at"
+    )
+    models_adapter = TypeAdapter(List[schemas.RunningLog])
+    logs = models_adapter.validate_python(crud.get_running_logs(db_session, user.id), from_attributes=True)
+    assert response.content == models_adapter.dump_json(logs)
+    assert [log["running_datetime"] for log in response.json()] == ["2023-01-01T10:00:00", "2023-01-02T10:00:00"]
+
+def test_bulk_import_json_and_ndjson(client, db_session, query_counter):
+    import json
+    from backend import models, aggregates
+    from backend.auth import get_current_user
+    from unittest.mock import patch
+
+    user = models.User(email="bulk@example.com")
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    rows = [
+        {"running_datetime": "2023-01-01T10:00:00", "step_count": 1500},
+        {"running_datetime": "2023-01-02T10:00:00", "distance_km": 2.0},
+        {"running_datetime": "2023-01-03T10:00:00"},
+        {"step_count": 10},
+    ]
+    response = client.post("/api/me/logs/bulk", json=rows)
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["failed"]) == (2, 2)
+    assert [row["error"] is None for row in data["results"]] == [True, True, False, False]
+    assert data["results"][2]["error"] == "Either step_count or distance_km must be provided"
+
+    ndjson_rows = [{"running_datetime": f"2023-02-{day:02d}T07:00:00", "step_count": 100} for day in range(1, 8)]
+    body = "\n".join(json.dumps(row) for row in ndjson_rows) + "\nnot json\n"
+    query_counter.clear()
+    with patch("backend.routers.users.settings.RUNORG_BULK_CHUNK_SIZE", 3):
+        response = client.post("/api/me/logs/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    data = response.json()
+    assert (data["created"], data["failed"]) == (7, 1)
+    assert data["results"][-1] == {"index": 7, "id": None, "error": "Invalid JSON"}
+    # Three chunks, one multi-row INSERT each, no per-row reloads
+    assert sum(s.startswith("INSERT INTO running_logs") for s in query_counter) == 3
+    assert not any(s.startswith("SELECT") and "FROM running_logs" in s for s in query_counter)
+    ids = [row["id"] for row in data["results"][:7]]
+    stored = {log.id: log.running_datetime.day for log in db_session.query(models.RunningLog).filter(models.RunningLog.id.in_(ids))}
+    assert [stored[log_id] for log_id in ids] == list(range(1, 8))
+
+    me = client.get("/api/me").json()
+    assert me["total_steps"] == 1500 + 3000 + 700
+    audit = db_session.query(models.AuditLog).filter(models.AuditLog.user_id == user.id).all()
+    assert [entry.message for entry in audit] == [
+        "Bulk imported 2 logs (2 rejected)",
+        "Bulk imported 7 logs (1 rejected)",
+    ]
+    assert aggregates.rebuild_weekly_totals(db_session, dry_run=True) == []
+
+def test_bulk_import_limits(client, db_session):
+    import json
+    from backend import models
+    from backend.auth import get_current_user
+    from unittest.mock import patch
+
+    user = models.User(email="limits@example.com")
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    app.dependency_overrides[get_current_user] = lambda: user
+    rows = [{"running_datetime": f"2023-03-{day:02d}T07:00:00", "step_count": 100} for day in range(1, 21)]
+    ndjson = "".join(json.dumps(row) + "\n" for row in rows)
+
+    # Reading stops at the row cap: one error, not one per remaining row
+    with patch("backend.routers.users.settings.RUNORG_BULK_MAX_ROWS", 5):
+        data = client.post("/api/me/logs/bulk", content=ndjson, headers={"Content-Type": "application/x-ndjson"}).json()
+    assert (data["created"], data["failed"]) == (5, 1)
+    assert data["results"][-1] == {"index": 5, "id": None, "error": "Import row limit of 5 exceeded"}
+
+    # A streamed NDJSON body stops at the byte cap
+    def chunks():
+        for row in rows:
+            yield (json.dumps(row) + "\n").encode()
+
+    line_size = len(json.dumps(rows[0])) + 1
+    with patch("backend.routers.users.settings.RUNORG_BULK_MAX_BODY_BYTES", line_size * 3):
+        data = client.post("/api/me/logs/bulk", content=chunks(), headers={"Content-Type": "application/x-ndjson"}).json()
+    assert (data["created"], data["failed"]) == (3, 1)
+    assert "size limit" in data["results"][-1]["error"]
+
+    # JSON arrays are parsed whole, so they get a smaller cap and a pointer to NDJSON
+    with patch("backend.routers.users.settings.RUNORG_BULK_MAX_JSON_BYTES", 100):
+        response = client.post("/api/me/logs/bulk", json=rows)
+    assert response.status_code == 413
+    assert "NDJSON" in response.json()["detail"]
+    assert client.get("/api/me").json()["total_steps"] == 800
+
+
+def test_me_falls_back_to_primary_when_replica_lags(client, db_session, tmp_path, monkeypatch):
+    import asyncio
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from backend import models
+    from backend.auth import get_current_user, Principal
+    from backend.database import Base, get_read_db
+
+    user = models.User(email="fresh@example.com")
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    app.dependency_overrides[get_current_user] = lambda: Principal.from_user(user)
+    client.post("/api/me/logs", json={"running_datetime": "2023-01-01T10:00:00", "step_count": 300})
+
+    # While the replica has the user, no write session is opened, not even for a 304
+    from backend.routers import users
+    with monkeypatch.context() as patched:
+        patched.setattr(users, "AsyncSessionLocal", None)
+        etag = client.get("/api/me").headers["etag"]
+        assert client.get("/api/me", headers={"If-None-Match": etag}).status_code == 304
+        assert client.get("/api/me/rank").status_code == 200
+
+    # A replica that has not received the user yet
+    replica_url = f"sqlite:///{tmp_path}/replica.db"
+    Base.metadata.create_all(bind=create_engine(replica_url))
+    replica = create_async_engine(replica_url.replace("sqlite://", "sqlite+aiosqlite://"))
+    ReplicaSession = async_sessionmaker(replica, expire_on_commit=False)
+
+    async def override_get_read_db():
+        async with ReplicaSession() as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    try:
+        response = client.get("/api/me")
+        assert response.status_code == 200
+        assert (response.json()["email"], response.json()["total_steps"]) == ("fresh@example.com", 300)
+
+        response = client.get("/api/me/rank")
+        assert response.status_code == 200
+        assert (response.json()["rank"], response.json()["total_users"]) == (1, 1)
+    finally:
+        asyncio.run(replica.dispose())
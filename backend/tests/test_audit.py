@@ -0,0 +1,163 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend import models, crud
+from backend.audit import AuditSink
+
+
+def _make_user(db_session, email="audit@example.com"):
+    user = models.User(email=email)
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    return user
+
+
+def test_transaction_mode_commits_with_business_write(db_session):
+    user = _make_user(db_session)
+    log = crud.create_running_log(db_session, models.RunningLog(
+        owner_id=user.id, running_datetime=datetime(2023, 1, 1), step_count=10, distance_km=0.01
+    ), user_id=user.id)
+    assert [a.message for a in db_session.query(models.AuditLog)] == [f"Created log id {log.id}"]
+
+    # A failed business write leaves no audit entry behind
+    with patch("backend.crud.aggregates.apply_log_deltas", side_effect=RuntimeError("boom")):
+        with pytest.raises(RuntimeError):
+            crud.create_running_log(db_session, models.RunningLog(
+                owner_id=user.id, running_datetime=datetime(2023, 1, 2), step_count=10, distance_km=0.01
+            ), user_id=user.id)
+    db_session.rollback()
+    assert db_session.query(models.AuditLog).count() == 1
+
+
+def test_first_login_creates_user_with_audit_entry_once(db_session, query_counter):
+    user = crud.get_or_create_user(db_session, "New@Example.com", audit_message="User created via login")
+    # Lookup, the upsert, the data version and the audit row, one transaction
+    statements = list(query_counter)
+    assert [s.split()[0] for s in statements] == ["SELECT", "INSERT", "INSERT", "INSERT"]
+    assert "ON CONFLICT (email) DO NOTHING RETURNING" in statements[1]
+    assert "data_version" in statements[2]
+    assert user.email == "new@example.com"
+
+    assert crud.get_or_create_user(db_session, "new@example.com").id == user.id
+    assert [(a.user_id, a.message) for a in db_session.query(models.AuditLog)] == [(user.id, "User created via login")]
+
+
+def test_first_login_race_reads_the_winners_row(db_session):
+    Session = sessionmaker(bind=db_session.get_bind())
+    real_lookup = crud.get_user_by_email
+    lookups = []
+
+    def lookup_then_lose_race(db, email):
+        # Another worker inserts the user between our lookup and our insert
+        lookups.append(email)
+        if len(lookups) == 1:
+            with Session() as other:
+                crud.get_or_create_user(other, email, audit_message="winner")
+            return None
+        return real_lookup(db, email)
+
+    with patch("backend.crud.get_user_by_email", side_effect=lookup_then_lose_race):
+        user = crud.get_or_create_user(db_session, "race@example.com", audit_message="loser")
+
+    assert db_session.query(models.User).filter_by(email="race@example.com").one().id == user.id
+    assert [a.message for a in db_session.query(models.AuditLog)] == ["winner"]
+
+
+def test_concurrent_first_logins_create_one_user(db_session):
+    Session = sessionmaker(bind=db_session.get_bind())
+    barrier = threading.Barrier(8)
+
+    def login(_):
+        with Session() as db:
+            barrier.wait()
+            return crud.get_or_create_user(db, "spike@example.com").id
+
+    with ThreadPoolExecutor(8) as pool:
+        ids = set(pool.map(login, range(8)))
+
+    assert len(ids) == 1
+    assert db_session.query(models.User).count() == 1
+    assert db_session.query(models.AuditLog).count() == 1
+
+
+def test_async_mode_batches_and_flushes_on_stop(db_session):
+    alice = _make_user(db_session, "alice@example.com")
+    bob = _make_user(db_session, "bob@example.com")
+    sink = AuditSink(mode="async", batch_size=1000, flush_interval=60,
+                     session_factory=sessionmaker(bind=db_session.get_bind()))
+    sink.start()
+
+    expected = []
+    for i in range(5):
+        for user in (alice, bob):
+            sink.record(db_session, user.id, f"event {i}")
+            expected.append((user.id, f"event {i}"))
+    # Nothing reached the caller's session, and nothing is queued before it commits
+    assert not db_session.new
+    assert sink._queue.qsize() == 0
+    db_session.commit()
+    sink.stop()
+
+    rows = db_session.query(models.AuditLog).order_by(models.AuditLog.id).all()
+    assert [(row.user_id, row.message) for row in rows] == expected
+
+
+def test_async_mode_flushes_at_batch_size(db_session):
+    user = _make_user(db_session)
+    sink = AuditSink(mode="async", batch_size=3, flush_interval=60,
+                     session_factory=sessionmaker(bind=db_session.get_bind()))
+    sink.start()
+    try:
+        for i in range(3):
+            sink.record(db_session, user.id, f"event {i}")
+        db_session.commit()
+        deadline = time.monotonic() + 2
+        while db_session.query(models.AuditLog).count() < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert db_session.query(models.AuditLog).count() == 3
+    finally:
+        sink.stop()
+
+
+def test_async_mode_drops_entries_of_rolled_back_transactions(db_session):
+    user = _make_user(db_session)
+    sink = AuditSink(mode="async", session_factory=sessionmaker(bind=db_session.get_bind()))
+    sink.record(db_session, user.id, "never happened")
+    db_session.rollback()
+    sink.record(db_session, user.id, "happened")
+    db_session.commit()
+    sink.stop()
+    assert [row.message for row in db_session.query(models.AuditLog)] == ["happened"]
+
+
+def test_async_mode_queue_is_bounded(db_session):
+    user = _make_user(db_session)
+    sink = AuditSink(mode="async", max_queue=3, session_factory=sessionmaker(bind=db_session.get_bind()))
+    for i in range(5):
+        sink.record(db_session, user.id, f"event {i}")
+    db_session.commit()
+    assert sink.dropped == 2
+
+    # A failed write puts the batch back without growing past the bound
+    broken = MagicMock()
+    broken.return_value.execute.side_effect = RuntimeError("audit database down")
+    with patch.object(sink, "_session_factory", broken):
+        with pytest.raises(RuntimeError):
+            sink.flush()
+    sink.record(db_session, user.id, "event 5")
+    db_session.commit()
+    assert sink.dropped == 3
+    sink.stop()
+    assert [row.message for row in db_session.query(models.AuditLog)] == ["event 0", "event 1", "event 2"]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        AuditSink(mode="sometimes")
@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from backend.main import app
 
 def test_auth_callback_success(client):
@@ -11,9 +11,10 @@ def test_auth_callback_success(client):
     mock_settings.OIDC_CALLBACK_URL = "http://localhost:8000/api/auth/callback"
     
     with patch("backend.routers.auth.settings", mock_settings):
-        # Mock httpx.AsyncClient
-        with patch("backend.routers.auth.httpx.AsyncClient") as MockClient:
-            mock_client_instance = MockClient.return_value.__aenter__.return_value
+        # Mock the shared httpx.AsyncClient
+        with patch("backend.http_client.get_http_client") as mock_get_client:
+            mock_client_instance = AsyncMock()
+            mock_get_client.return_value = mock_client_instance
             
             # Setup mock response for token exchange
             mock_response = MagicMock()
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from backend.config import Settings
+from backend.database import create_async_db_engine, create_db_engine, read_only_url
+
+
+def test_sqlite_profile_applied_to_every_connection(tmp_path):
+    profile = Settings(SQLITE_CACHE_SIZE_KIB=2048, SQLITE_BUSY_TIMEOUT_MS=1234, DB_POOL_SIZE=2, DB_MAX_OVERFLOW=0)
+    engine = create_db_engine(f"sqlite:///{tmp_path}/profile.db", settings=profile)
+    try:
+        assert engine.pool.size() == 2
+        with engine.connect() as first, engine.connect() as second:
+            for conn in (first, second):
+                assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+                assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+                assert conn.execute(text("PRAGMA cache_size")).scalar() == -2048
+                assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+    finally:
+        engine.dispose()
+
+
+def test_read_only_url():
+    url = read_only_url("sqlite:////data/app.db")
+    assert (url.database, dict(url.query)) == ("file:/data/app.db", {"mode": "ro", "uri": "true"})
+    assert read_only_url("sqlite:///:memory:").database == ":memory:"
+    assert read_only_url("postgresql://replica/runorg").render_as_string() == "postgresql://replica/runorg"
+
+
+def test_read_engine_has_its_own_pool_and_cannot_write(tmp_path):
+    profile = Settings(DB_POOL_SIZE=2, DB_READ_POOL_SIZE=3, DB_READ_MAX_OVERFLOW=0)
+    url = f"sqlite:///{tmp_path}/replica.db"
+    writer = create_db_engine(url, settings=profile)
+    reader = create_async_db_engine(url, settings=profile, read_only=True)
+
+    async def read_then_write():
+        async with reader.connect() as conn:
+            assert (await conn.execute(text("SELECT count(*) FROM t"))).scalar() == 1
+            assert (await conn.execute(text("PRAGMA query_only"))).scalar() == 1
+            with pytest.raises(OperationalError, match="readonly"):
+                await conn.execute(text("INSERT INTO t VALUES (2)"))
+
+    try:
+        with writer.begin() as conn:
+            conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+        assert reader.pool.size() == 3
+        asyncio.run(read_then_write())
+        # The writer's journal mode is kept, the reader does not try to change it
+        with writer.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    finally:
+        asyncio.run(reader.dispose())
+        writer.dispose()
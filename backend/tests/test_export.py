@@ -0,0 +1,114 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+from backend import models, crud, export, auth
+from backend.main import app
+from backend.auth import get_current_user
+
+
+def _seed(db_session):
+    users = []
+    for email, first in [("ann@example.com", "Ann"), ("bob@example.com", None)]:
+        user = models.User(email=email, firstname=first, lastname="Runner" if first else None)
+        db_session.add(user)
+        db_session.flush()
+        users.append(user)
+        for day in range(1, 11):
+            crud.create_running_log(db_session, models.RunningLog(
+                owner_id=user.id, running_datetime=datetime(2023, 1, day, 7), step_count=day * 100, distance_km=day / 15
+            ), user_id=user.id)
+    return users
+
+
+def _as_admin(db_session, monkeypatch, email="hr@example.com"):
+    admin = models.User(email=email)
+    db_session.add(admin)
+    db_session.commit()
+    db_session.refresh(admin)
+    monkeypatch.setattr(auth.settings, "RUNORG_ADMIN_EMAILS", f"other@example.com, {email.upper()}")
+    app.dependency_overrides[get_current_user] = lambda: admin
+    return admin
+
+
+def test_export_requires_admin(client, db_session, monkeypatch):
+    user = models.User(email="runner@example.com")
+    db_session.add(user)
+    db_session.commit()
+    monkeypatch.setattr(auth.settings, "RUNORG_ADMIN_EMAILS", "hr@example.com")
+    app.dependency_overrides[get_current_user] = lambda: user
+    assert client.get("/api/admin/export/logs").status_code == 403
+
+
+def test_export_logs_csv_with_filters(client, db_session, monkeypatch):
+    ann, bob = _seed(db_session)
+    _as_admin(db_session, monkeypatch)
+    # Several partitions, so the stream really is chunked
+    monkeypatch.setattr(export.settings, "RUNORG_EXPORT_CHUNK_SIZE", 3)
+
+    response = client.get("/api/admin/export/logs", params={"start": "2023-01-03", "end": "2023-01-08", "email": "ANN@example.com"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="logs.csv"' in response.headers["content-disposition"]
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["step_count"]) for row in rows] == [300, 400, 500, 600, 700, 800]
+    assert {row["email"] for row in rows} == {"ann@example.com"}
+    assert rows[0]["firstname"] == "Ann"
+    assert rows[0]["running_datetime"] == "2023-01-03T07:00:00"
+
+    by_id = client.get("/api/admin/export/logs", params=[("user_id", bob.id), ("user_id", ann.id)])
+    assert len(list(csv.DictReader(io.StringIO(by_id.text)))) == 20
+
+
+def test_export_aggregates_ndjson_gzip(client, db_session, monkeypatch):
+    ann, bob = _seed(db_session)
+    _as_admin(db_session, monkeypatch)
+
+    response = client.get("/api/admin/export/user_totals", params={"format": "ndjson", "gzip": "true"})
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="user_totals.ndjson.gz"' in response.headers["content-disposition"]
+    rows = [json.loads(line) for line in gzip.decompress(response.content).decode().splitlines()]
+    assert [(row["email"], row["total_steps"], row["log_count"]) for row in rows] == [
+        ("ann@example.com", 5500, 10), ("bob@example.com", 5500, 10), ("hr@example.com", 0, 0)
+    ]
+    assert rows[1]["firstname"] is None
+
+    weekly = client.get("/api/admin/export/weekly_totals", params={"format": "ndjson", "end": "2023-01-01"})
+    assert [json.loads(line)["week"] for line in weekly.text.splitlines()] == ["2023-W00", "2023-W00"]
+
+    assert client.get("/api/admin/export/user_totals", params={"start": "2023-01-01"}).status_code == 400
+    assert client.get("/api/admin/export/logs", params={"format": "xml"}).status_code == 400
+    assert client.get("/api/admin/export/secrets").status_code == 404
+
+
+def test_export_cli(db_session, tmp_path, monkeypatch):
+    from sqlalchemy.orm import sessionmaker
+    from backend import database
+    _seed(db_session)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=db_session.get_bind()))
+
+    output = tmp_path / "logs.csv.gz"
+    assert export.main(["logs", "--gzip", "--start", "2023-01-10", "-o", str(output)]) == 0
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(output.read_bytes()).decode())))
+    assert [(row["email"], row["step_count"]) for row in rows] == [("ann@example.com", "1000"), ("bob@example.com", "1000")]
+
+
+def test_export_streams_from_the_read_engine(client, db_session, monkeypatch):
+    from sqlalchemy import event
+    from backend.database import get_async_db, get_read_db
+    _seed(db_session)
+    admin = _as_admin(db_session, monkeypatch)
+    executed = []
+    for dependency in (get_read_db, get_async_db):
+        async def recording(override=app.dependency_overrides[dependency], name=dependency.__name__):
+            async for db in override():
+                event.listen(db.sync_session, "do_orm_execute", lambda state: executed.append((name, str(state.statement))))
+                yield db
+        app.dependency_overrides[dependency] = recording
+
+    assert len(client.get("/api/admin/export/logs").text.splitlines()) == 21
+    assert [name for name, statement in executed if "FROM running_logs" in statement] == ["get_read_db"]
+    audit = db_session.query(models.AuditLog).filter(models.AuditLog.user_id == admin.id).all()
+    assert [entry.message for entry in audit] == ["Exported logs"]
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from datetime import datetime
+from backend import models, crud, aggregates, live
+from backend.main import app
+from backend.routers import stats
+
+
+def _add_runner(db_session, email, steps):
+    user = models.User(email=email)
+    db_session.add(user)
+    db_session.flush()
+    crud.create_running_log(db_session, models.RunningLog(
+        owner_id=user.id, running_datetime=datetime(2023, 1, 1), step_count=steps, distance_km=steps / 1500
+    ), user_id=user.id)
+    return user
+
+
+def _make_hub(session_factory=None, **kwargs):
+    return live.LiveHub(stats._live_snapshot, session_factory, poll_interval=3600, **kwargs)
+
+
+def test_snapshot_is_serialized_once_and_only_on_change(db_session, async_session_factory):
+    _add_runner(db_session, "first@example.com", 500)
+
+    async def scenario():
+        hub = _make_hub(async_session_factory)
+        a, b = hub.subscribe(), hub.subscribe()
+        # The first subscriber starts the poller, which publishes right away
+        frame = await asyncio.wait_for(a.get(), timeout=5)
+        assert b.get_nowait() is frame
+        payload = json.loads(frame.decode().split("data: ", 1)[1])
+        assert payload["progress"]["total_steps"] == 500
+        assert payload["leaderboard"][0]["email_masked"] == "fir***@example.com"
+
+        # A version bump that leaves the snapshot as it was is not broadcast
+        assert not await hub.poll_once()
+        aggregates.bump_data_version(db_session)
+        db_session.commit()
+        assert not await hub.poll_once()
+
+        _add_runner(db_session, "second@example.com", 900)
+        assert await hub.poll_once()
+        assert json.loads(a.get_nowait().decode().split("data: ", 1)[1])["progress"]["total_steps"] == 1400
+
+        # Late subscribers start from the latest snapshot
+        assert hub.subscribe().get_nowait() is hub._frame
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+
+def test_slow_consumer_is_dropped():
+    async def scenario():
+        hub = _make_hub(queue_size=2)
+        slow, fast = hub.subscribe(), hub.subscribe()
+        for i in range(3):
+            hub.publish(f"data: {i}\n\n".encode())
+            fast.get_nowait()
+        assert hub.stats["dropped"] == 1
+        assert hub.subscriber_count == 1
+        assert slow.get_nowait() is None
+        await hub.stop()
+        assert fast.get_nowait() is None
+
+    asyncio.run(scenario())
+
+
+def test_live_endpoint_streams_snapshot(db_session, async_session_factory, monkeypatch):
+    _add_runner(db_session, "stream@example.com", 700)
+    hub = _make_hub(async_session_factory)
+    monkeypatch.setattr(stats, "live_hub", hub)
+
+    async def first_event():
+        chunks = []
+        headers = {}
+        disconnected = asyncio.Event()
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                headers.update({k.decode(): v.decode() for k, v in message["headers"]})
+            elif message["type"] == "http.response.body" and message.get("body"):
+                chunks.append(message["body"])
+                disconnected.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/api/stats/live", "raw_path": b"/api/stats/live", "root_path": "",
+            "query_string": b"", "headers": [], "client": ("test", 1), "server": ("test", 80),
+        }
+        await asyncio.wait_for(app(scope, receive, send), timeout=5)
+        # The client went away, so its queue is gone
+        assert hub.subscriber_count == 0
+        await hub.stop()
+        return headers, b"".join(chunks).decode()
+
+    headers, body = asyncio.run(first_event())
+    assert headers["content-type"].startswith("text/event-stream")
+    assert body.startswith("id: ")
+    assert "event: snapshot" in body
+    assert json.loads(body.split("data: ", 1)[1])["progress"]["total_steps"] == 700
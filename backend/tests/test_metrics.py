@@ -0,0 +1,88 @@
+import asyncio
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from backend import metrics
+from backend.database import get_read_db
+from backend.main import app
+
+
+def test_histogram_and_counter_exposition():
+    registry = metrics.Registry()
+    requests = registry.register(metrics.Counter("t_requests_total", "Requests.", ("route",)))
+    latency = registry.register(metrics.Histogram("t_latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0)))
+    requests.inc('/a"b')
+    requests.inc('/a"b')
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, "/x")
+
+    assert registry.render().splitlines() == [
+        "# HELP t_requests_total Requests.",
+        "# TYPE t_requests_total counter",
+        't_requests_total{route="/a\\"b"} 2',
+        "# HELP t_latency_seconds Latency.",
+        "# TYPE t_latency_seconds histogram",
+        't_latency_seconds_bucket{route="/x",le="0.1"} 2',
+        't_latency_seconds_bucket{route="/x",le="1"} 3',
+        't_latency_seconds_bucket{route="/x",le="+Inf"} 4',
+        't_latency_seconds_sum{route="/x"} 3.65',
+        't_latency_seconds_count{route="/x"} 4',
+    ]
+
+
+def test_middleware_records_route_templates_and_queries(db_session, async_session_factory):
+    metrics.registry.clear()
+    remove = metrics.instrument_engine(async_session_factory.kw["bind"].sync_engine, "test")
+
+    async def override_get_read_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    try:
+        with TestClient(metrics.MetricsMiddleware(app)) as client:
+            client.get("/api/stats/progress")
+            client.get("/api/stats/progress")
+            client.get("/api/me/logs/123")
+            client.get("/does-not-exist")
+    finally:
+        app.dependency_overrides.clear()
+        remove()
+
+    assert metrics.HTTP_REQUESTS.value("GET", "/api/stats/progress", "200") == 2
+    # Templates, not raw paths
+    assert metrics.HTTP_REQUESTS.value("GET", "/api/me/logs/{log_id}", "405") == 1
+    assert metrics.HTTP_REQUESTS.value("GET", metrics.UNMATCHED_ROUTE, "404") == 1
+    assert metrics.HTTP_LATENCY.count("GET", "/api/stats/progress") == 2
+    assert metrics.HTTP_IN_FLIGHT.value("GET") == 0
+    # Data version, then the counter row
+    assert metrics.DB_REQUEST_QUERIES.sum("/api/stats/progress") == 4
+    assert metrics.DB_QUERIES.value("test") >= 4
+
+
+def test_timed_pool_records_checkouts(tmp_path):
+    metrics.registry.clear()
+    from sqlalchemy.pool import QueuePool
+    engine = create_engine(f"sqlite:///{tmp_path}/pool.db", poolclass=metrics.timed_pool(QueuePool, "pooltest"))
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    engine.dispose()
+    assert metrics.DB_POOL_WAIT.count("pooltest") == 2
+
+
+def test_http_client_hooks_time_outbound_calls():
+    metrics.registry.clear()
+
+    async def handler(request):
+        return httpx.Response(200, json={"issuer": "https://idp.test"})
+
+    async def call():
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), event_hooks=metrics.http_client_event_hooks()
+        ) as client:
+            await client.get("https://idp.test/.well-known/openid-configuration")
+
+    asyncio.run(call())
+    assert metrics.HTTP_CLIENT_LATENCY.count("idp.test", "GET", "200") == 1
@@ -1,5 +1,6 @@
+import asyncio
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from jose import jwt
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
@@ -8,7 +9,7 @@ from backend.main import app
 from backend import models
 
 # Helper to generate RSA key pair
-def generate_rsa_key_pair():
+def generate_rsa_key_pair(kid="test-key-id"):
     private_key = rsa.generate_private_key(
         public_exponent=65537,
         key_size=2048,
@@ -55,7 +56,7 @@ def generate_rsa_key_pair():
     jwk = {
         "kty": "RSA",
         "use": "sig",
-        "kid": "test-key-id",
+        "kid": kid,
         "alg": "RS256",
         "n": n,
         "e": e
@@ -71,6 +72,9 @@ def mock_oidc_setup():
     mock_settings.OIDC_ISSUER = "https://mock-oidc.com"
     mock_settings.OIDC_AUDIENCE = "test-audience"
     mock_settings.OIDC_ALGORITHMS = ["RS256"]
+    mock_settings.OIDC_JWKS_CACHE_TTL_SECONDS = 3600
+    mock_settings.OIDC_JWKS_MIN_REFRESH_SECONDS = 30
+    mock_settings.OIDC_HTTP_TIMEOUT_SECONDS = 5.0
     
     mock_discovery = {
         "issuer": "https://mock-oidc.com",
@@ -93,9 +97,10 @@ def test_oidc_login_flow(client, db_session, mock_oidc_setup):
     # So we patch 'backend.auth.settings'.
     
     with patch("backend.auth.settings", mock_settings):
-        # Mock httpx.Client used for fetching JWKS
-        with patch("backend.auth.httpx.Client") as MockClient:
-            mock_http_client = MockClient.return_value
+        # Mock the shared httpx.AsyncClient used for fetching JWKS
+        with patch("backend.http_client.get_http_client") as mock_get_client:
+            mock_http_client = AsyncMock()
+            mock_get_client.return_value = mock_http_client
             
             # Setup mock responses
             # First call: discovery
@@ -147,10 +152,204 @@ def test_oidc_login_flow(client, db_session, mock_oidc_setup):
             # Call verify_oidc_token directly
             from backend.auth import verify_oidc_token
             
-            claims = verify_oidc_token(token)
+            claims = asyncio.run(verify_oidc_token(token))
             
             assert claims["email"] == "oidc_user@example.com"
             assert claims["iss"] == "https://mock-oidc.com"
             
             # Verify HTTP calls were made
             assert mock_http_client.get.call_count >= 2
+
+
+class StubIdP:
+    """Minimal OIDC provider served through httpx.MockTransport."""
+
+    issuer = "https://stub-idp.test"
+
+    def __init__(self, delay=0.0):
+        self.keys = {}
+        self.published = []
+        self.requests = []
+        self.delay = delay
+        self.now = 0.0
+
+    def add_key(self, kid, publish=True):
+        private_key, jwk = generate_rsa_key_pair(kid)
+        self.keys[kid] = private_key
+        if publish:
+            self.published.append(jwk)
+        return jwk
+
+    def sign(self, kid, email="stub_user@example.com"):
+        private_key_pem = self.keys[kid].private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        return jwt.encode(
+            {
+                "email": email,
+                "aud": "test-audience",
+                "iss": self.issuer,
+                "exp": datetime.now(timezone.utc) + timedelta(hours=1)
+            },
+            private_key_pem,
+            algorithm="RS256",
+            headers={"kid": kid}
+        )
+
+    async def handler(self, request):
+        import httpx
+        self.requests.append(request.url.path)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if request.url.path == "/.well-known/openid-configuration":
+            return httpx.Response(200, json={
+                "issuer": self.issuer,
+                "authorization_endpoint": f"{self.issuer}/auth",
+                "jwks_uri": f"{self.issuer}/keys"
+            })
+        if request.url.path == "/keys":
+            return httpx.Response(200, json={"keys": list(self.published)})
+        return httpx.Response(404)
+
+    def client(self):
+        import httpx
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+
+@pytest.fixture
+def stub_idp():
+    import httpx
+    idp = StubIdP()
+    mock_settings = MagicMock()
+    mock_settings.OIDC_ISSUER = idp.issuer
+    mock_settings.OIDC_AUDIENCE = "test-audience"
+    mock_settings.OIDC_ALGORITHMS = ["RS256"]
+    mock_settings.OIDC_JWKS_CACHE_TTL_SECONDS = 3600
+    mock_settings.OIDC_JWKS_MIN_REFRESH_SECONDS = 30
+    mock_settings.OIDC_HTTP_TIMEOUT_SECONDS = 5.0
+
+    from backend import auth
+    auth._oidc_caches[idp.issuer] = auth.OIDCMetadataCache(
+        idp.issuer, ttl=3600, min_refresh_interval=30, clock=lambda: idp.now
+    )
+
+    with patch("backend.auth.settings", mock_settings), \
+            patch("backend.http_client._client", idp.client()):
+        yield idp
+
+
+def test_jwks_cache_reuses_keys(stub_idp):
+    from backend import auth
+    stub_idp.add_key("k1")
+
+    async def scenario():
+        for _ in range(5):
+            assert (await auth.verify_oidc_token(stub_idp.sign("k1")))["email"] == "stub_user@example.com"
+        assert await auth.get_oidc_config_url(stub_idp.issuer) == f"{stub_idp.issuer}/auth"
+
+    asyncio.run(scenario())
+    assert stub_idp.requests == ["/.well-known/openid-configuration", "/keys"]
+    stats = auth.get_oidc_cache(stub_idp.issuer).stats
+    assert stats["refreshes"] == 1
+    assert stats["hits"] == 5
+
+
+def test_jwks_cache_refreshes_on_key_rotation(stub_idp):
+    from backend import auth
+    from jose import JWTError
+    stub_idp.add_key("k1")
+
+    async def scenario():
+        await auth.verify_oidc_token(stub_idp.sign("k1"))
+
+        # Provider rotates to a new key
+        stub_idp.now += 60
+        stub_idp.add_key("k2")
+        assert (await auth.verify_oidc_token(stub_idp.sign("k2")))["email"] == "stub_user@example.com"
+        assert auth.get_oidc_cache(stub_idp.issuer).stats["refreshes"] == 2
+
+        # Unknown kids are rate limited: no refetch within the minimum refresh interval
+        stub_idp.add_key("rogue", publish=False)
+        for _ in range(3):
+            with pytest.raises(JWTError):
+                await auth.verify_oidc_token(stub_idp.sign("rogue"))
+        assert auth.get_oidc_cache(stub_idp.issuer).stats["refreshes"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_jwks_cache_ttl_expiry():
+    from backend import auth
+    idp = StubIdP()
+    idp.add_key("k1")
+    now = [0.0]
+    cache = auth.OIDCMetadataCache(idp.issuer, ttl=60, min_refresh_interval=10, clock=lambda: now[0])
+
+    async def scenario():
+        await cache.get_signing_keys("k1")
+        now[0] = 59
+        await cache.get_signing_keys("k1")
+        assert cache.stats["refreshes"] == 1
+        now[0] = 61
+        await cache.get_signing_keys("k1")
+        assert cache.stats["refreshes"] == 2
+
+    with patch("backend.http_client._client", idp.client()):
+        asyncio.run(scenario())
+
+
+def test_jwks_cache_single_flight(stub_idp):
+    from backend import auth
+    stub_idp.add_key("k1")
+    stub_idp.delay = 0.05
+    token = stub_idp.sign("k1")
+
+    async def scenario():
+        return await asyncio.gather(*(auth.verify_oidc_token(token) for _ in range(8)))
+
+    results = asyncio.run(scenario())
+    assert all(claims["email"] == "stub_user@example.com" for claims in results)
+    assert stub_idp.requests == ["/.well-known/openid-configuration", "/keys"]
+
+
+def test_shared_http_client_lifecycle(client):
+    from backend import http_client
+    # Started by the app lifespan and reused across calls
+    assert http_client._client is not None
+    assert http_client.get_http_client() is http_client.get_http_client()
+
+
+def test_app_import_does_not_load_auth_stack():
+    import os
+    import subprocess
+    import sys
+    code = "import sys, backend.main; print(sorted(m for m in ('jose', 'httpx', 'cryptography') if m in sys.modules))"
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_warm_up_primes_oidc_metadata_and_database(stub_idp, async_session_factory, caplog):
+    from backend import auth, warmup
+    stub_idp.add_key("k1")
+
+    def broken_factory():
+        raise RuntimeError("no database")
+
+    async def scenario():
+        timings = await warmup.warm_up((async_session_factory,), stub_idp.issuer)
+        assert list(timings) == ["settings", "auth", "database", "oidc"]
+        assert stub_idp.requests == ["/.well-known/openid-configuration", "/keys"]
+        # The first login and /api/config are served from the cache
+        assert (await auth.verify_oidc_token(stub_idp.sign("k1")))["email"] == "stub_user@example.com"
+        assert await auth.get_oidc_config_url(stub_idp.issuer) == f"{stub_idp.issuer}/auth"
+        assert len(stub_idp.requests) == 2
+
+        # A failing step is logged, the others still run
+        timings = await warmup.warm_up((broken_factory,), "")
+        assert "oidc" in timings
+
+    asyncio.run(scenario())
+    assert any("Warm-up step database failed: no database" in record.getMessage() for record in caplog.records)
@@ -0,0 +1,53 @@
+from backend import auth, models
+
+
+def _auth_header(email):
+    return {"Authorization": f"Bearer {auth.create_access_token(data={'sub': email})}"}
+
+
+def test_verified_token_skips_decode_and_lookup(client, db_session, query_counter):
+    headers = _auth_header("cached@example.com")
+    assert client.get("/api/me", headers=headers).status_code == 200
+    user = db_session.query(models.User).filter(models.User.email == "cached@example.com").one()
+
+    query_counter.clear()
+    response = client.get("/api/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["email"] == "cached@example.com"
+    assert not any("WHERE users.email" in statement for statement in query_counter)
+    assert auth.principal_cache.get(headers["Authorization"][7:]).id == user.id
+
+
+def test_profile_update_invalidates_cached_principal(client, db_session):
+    headers = _auth_header("rename@example.com")
+    assert client.get("/api/me", headers=headers).json()["firstname"] is None
+
+    client.put("/api/me", json={"firstname": "Jane", "lastname": "Roe"}, headers=headers)
+    assert client.get("/api/me", headers=headers).json()["firstname"] == "Jane"
+
+
+def test_principal_cache_expiry_and_bound():
+    now = [1000.0]
+    cache = auth.PrincipalCache(maxsize=2, ttl=60, clock=lambda: now[0])
+    alice = auth.Principal(id=1, email="alice@example.com")
+    bob = auth.Principal(id=2, email="bob@example.com")
+
+    cache.put("t-alice", alice, token_expires_at=1010)
+    cache.put("t-bob", bob, token_expires_at=5000)
+    assert cache.get("t-alice") == alice
+
+    # Least recently used entry goes first
+    cache.put("t-bob-2", bob, token_expires_at=5000)
+    assert cache.get("t-bob") is None
+    assert cache.get("t-alice") == alice
+
+    # Evicted at token expiry, and after the TTL cap otherwise
+    now[0] = 1010
+    assert cache.get("t-alice") is None
+    assert cache.get("t-bob-2") == bob
+    now[0] = 1061
+    assert cache.get("t-bob-2") is None
+
+    cache.put("t-bob-3", bob, token_expires_at=5000)
+    cache.invalidate_user(bob.id)
+    assert cache.get("t-bob-3") is None
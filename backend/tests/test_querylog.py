@@ -0,0 +1,89 @@
+import logging
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from backend import querylog
+from backend.database import get_read_db
+from backend.main import app
+
+
+def test_statement_shape_collapses_literals_and_in_lists():
+    assert querylog.statement_shape("SELECT *\n  FROM users WHERE id = 7") == "SELECT * FROM users WHERE id = ?"
+    assert querylog.statement_shape("SELECT * FROM t WHERE id IN (?, ?, ?) AND name = 'o''k'") == (
+        "SELECT * FROM t WHERE id IN (?) AND name = ?"
+    )
+
+
+def test_middleware_logs_repeated_statements_and_budget(tmp_path, caplog):
+    engine = create_engine(f"sqlite:///{tmp_path}/n1.db")
+    remove = querylog.instrument_engine(engine)
+    demo = FastAPI()
+
+    @demo.get("/items/{item_id}")
+    def read_items(item_id: int):
+        # One statement per row, the shape an N+1 leaves behind
+        with engine.connect() as conn:
+            return [conn.execute(text(f"SELECT {i}")).scalar() for i in range(4)]
+
+    try:
+        with caplog.at_level(logging.WARNING, logger="backend.querylog"):
+            response = TestClient(querylog.QueryLogMiddleware(demo, budget=3, repeat_threshold=3)).get("/items/1")
+    finally:
+        remove()
+        engine.dispose()
+
+    assert response.json() == [0, 1, 2, 3]
+    assert 'desc="4 queries"' in response.headers["server-timing"]
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("GET /items/{item_id} ran the same statement 4 times" in m and "SELECT ?" in m for m in messages)
+    assert any("ran 4 statements, over the budget of 3" in m for m in messages)
+
+
+def test_server_timing_header_on_api(db_session, async_session_factory):
+    remove = querylog.instrument_engine(async_session_factory.kw["bind"].sync_engine)
+
+    async def override_get_read_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    try:
+        with TestClient(querylog.QueryLogMiddleware(app)) as client:
+            response = client.get("/api/stats/leaderboard")
+    finally:
+        app.dependency_overrides.clear()
+        remove()
+
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("db;dur=")
+    assert 'desc="2 queries"' in response.headers["server-timing"]
+
+
+def test_metrics_and_query_log_share_one_listener(tmp_path, monkeypatch):
+    from backend import metrics
+    metrics.registry.clear()
+    engine = create_engine(f"sqlite:///{tmp_path}/shared.db")
+    remove = metrics.instrument_engine(engine, "shared")
+    demo = FastAPI()
+
+    @demo.get("/items")
+    def read_items():
+        with engine.connect() as conn:
+            return [conn.execute(text(f"SELECT {i}")).scalar() for i in range(3)]
+
+    logs = []
+    monkeypatch.setattr(querylog.QueryLogMiddleware, "check", lambda self, request, log: logs.append(log))
+    try:
+        # Installed the way main.py does: the metrics middleware outermost
+        response = TestClient(metrics.MetricsMiddleware(querylog.QueryLogMiddleware(demo))).get("/items")
+    finally:
+        remove()
+        engine.dispose()
+
+    assert response.json() == [0, 1, 2]
+    assert 'desc="3 queries"' in response.headers["server-timing"]
+    assert metrics.DB_QUERIES.value("shared") == 3
+    assert metrics.DB_REQUEST_QUERIES.sum("/items") == 3
+    # Both read the same record, one timing per statement
+    assert len(logs[0].statements) == 3
+    assert metrics.DB_REQUEST_QUERY_TIME.sum("/items") == logs[0].seconds
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from datetime import datetime
+from backend import models, crud, snapshot
+from backend.routers import stats
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _add_log(db_session, email, steps):
+    user = db_session.query(models.User).filter_by(email=email).first()
+    if user is None:
+        user = models.User(email=email)
+        db_session.add(user)
+        db_session.flush()
+    crud.create_running_log(db_session, models.RunningLog(
+        owner_id=user.id, running_datetime=datetime(2023, 3, 1, 7), step_count=steps, distance_km=steps / 1500
+    ), user_id=user.id)
+
+
+def _builder(session_factory, clock, **kwargs):
+    options = dict(interval=60, poll_interval=3600, max_staleness=10, clock=clock)
+    options.update(kwargs)
+    return snapshot.SnapshotBuilder(stats._build_snapshot, session_factory, **options)
+
+
+def test_snapshot_served_from_memory(client, db_session, async_session_factory, query_counter, monkeypatch):
+    _add_log(db_session, "snap@example.com", 1200)
+    clock = FakeClock()
+    builder = _builder(async_session_factory, clock)
+    monkeypatch.setattr(stats, "snapshot_builder", builder)
+
+    # Nothing built yet: the first request builds inline
+    first = client.get("/api/stats/snapshot")
+    assert first.status_code == 200
+    assert builder.stats["inline_builds"] == 1
+    data = first.json()
+    assert data["progress"]["total_steps"] == 1200
+    assert data["leaderboard"][0]["email_masked"] == "sna***@example.com"
+    assert [p["period"] for p in data["weekly"]["points"]] == ["2023-W09"]
+    assert data["max_staleness_seconds"] == 10
+    assert data["generated_at"]
+
+    query_counter.clear()
+    second = client.get("/api/stats/snapshot")
+    assert second.content == first.content
+    assert query_counter == []
+    assert client.get("/api/stats/snapshot", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    # A write is picked up by the next refresh; an unchanged version only confirms the snapshot
+    _add_log(db_session, "snap@example.com", 300)
+
+    async def refresh():
+        async with async_session_factory() as db:
+            return await builder.refresh(db)
+
+    assert asyncio.run(refresh())
+    assert not asyncio.run(refresh())
+    third = client.get("/api/stats/snapshot")
+    assert third.json()["progress"]["total_steps"] == 1500
+    assert third.headers["etag"] != first.headers["etag"]
+    assert builder.stats["builds"] == 2
+
+
+def test_snapshot_staleness_bound_forces_inline_rebuild(client, db_session, async_session_factory, monkeypatch):
+    _add_log(db_session, "stale@example.com", 100)
+    clock = FakeClock()
+    builder = _builder(async_session_factory, clock)
+    monkeypatch.setattr(stats, "snapshot_builder", builder)
+    client.get("/api/stats/snapshot")
+
+    # Within the bound the old snapshot is served, even though the data changed
+    _add_log(db_session, "stale@example.com", 100)
+    clock.now += 9
+    assert client.get("/api/stats/snapshot").json()["progress"]["total_steps"] == 100
+
+    # Past the bound without a background refresh, the request rebuilds it
+    clock.now += 2
+    assert client.get("/api/stats/snapshot").json()["progress"]["total_steps"] == 200
+    assert builder.stats["inline_builds"] == 2
+
+
+def test_snapshot_exposes_last_confirmation(client, db_session, async_session_factory, monkeypatch):
+    _add_log(db_session, "verified@example.com", 100)
+    clock = FakeClock()
+    builder = _builder(async_session_factory, clock)
+    monkeypatch.setattr(stats, "snapshot_builder", builder)
+    first = client.get("/api/stats/snapshot")
+    generated_at = datetime.fromisoformat(first.json()["generated_at"])
+    assert datetime.fromisoformat(first.headers["x-snapshot-verified-at"]) == generated_at
+
+    # Past the bound with unchanged data: the body (and generated_at) stays, the confirmation moves
+    clock.now += 11
+    second = client.get("/api/stats/snapshot", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 304
+    assert builder.stats["builds"] == 1
+    assert datetime.fromisoformat(second.headers["x-snapshot-verified-at"]) > generated_at
+
+
+def test_background_builder_refreshes(db_session, async_session_factory):
+    _add_log(db_session, "bg@example.com", 700)
+
+    async def scenario():
+        builder = _builder(async_session_factory, FakeClock(), poll_interval=0.01)
+        builder.start()
+        try:
+            for _ in range(500):
+                if builder.current is not None:
+                    break
+                await asyncio.sleep(0.01)
+            first = builder.current
+            assert json.loads(first.body)["progress"]["total_steps"] == 700
+
+            _add_log(db_session, "bg@example.com", 300)
+            for _ in range(500):
+                if builder.current is not first:
+                    break
+                await asyncio.sleep(0.01)
+            assert json.loads(builder.current.body)["progress"]["total_steps"] == 1000
+        finally:
+            await builder.stop()
+
+    asyncio.run(scenario())
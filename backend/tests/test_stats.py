@@ -0,0 +1,234 @@
+from datetime import datetime
+from backend import models, crud
+from backend.auth import Principal
+
+
+def _seed_users(db_session, count, logs_per_user=3, start=0):
+    for i in range(start, start + count):
+        user = models.User(email=f"runner{i}@example.com")
+        db_session.add(user)
+        db_session.flush()
+        for j in range(logs_per_user):
+            crud.create_running_log(db_session, models.RunningLog(
+                owner_id=user.id,
+                running_datetime=datetime(2023, 1, 1 + j),
+                step_count=(i + 1) * 100,
+                distance_km=(i + 1) / 15
+            ), user_id=user.id)
+
+
+def test_leaderboard_query_count_is_constant(client, db_session, query_counter):
+    _seed_users(db_session, 3)
+    query_counter.clear()
+    response = client.get("/api/stats/leaderboard")
+    assert response.status_code == 200
+    small = len(query_counter)
+
+    _seed_users(db_session, 30, start=3)
+    query_counter.clear()
+    response = client.get("/api/stats/leaderboard")
+    assert response.status_code == 200
+    assert len(query_counter) == small
+
+
+def test_leaderboard_order_and_ties(client, db_session):
+    for email, steps in [("a@example.com", 500), ("b@example.com", 900), ("c@example.com", 500)]:
+        user = models.User(email=email)
+        db_session.add(user)
+        db_session.flush()
+        crud.create_running_log(db_session, models.RunningLog(
+            owner_id=user.id, running_datetime=datetime(2023, 1, 1), step_count=steps, distance_km=steps / 1500
+        ), user_id=user.id)
+    db_session.add(models.User(email="idle@example.com"))
+    db_session.commit()
+
+    data = client.get("/api/stats/leaderboard").json()
+    assert [entry["email_masked"] for entry in data] == [
+        "b***@example.com", "a***@example.com", "c***@example.com", "idl***@example.com"
+    ]
+    assert [entry["steps"] for entry in data] == [900, 500, 500, 0]
+    # Tied runners share a rank
+    assert [entry["rank"] for entry in data] == [1, 2, 2, 4]
+
+
+def test_stats_conditional_get(client, db_session, query_counter):
+    _seed_users(db_session, 2)
+    for path in ("/api/stats/progress", "/api/stats/weekly", "/api/stats/leaderboard"):
+        response = client.get(path)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert etag.startswith('"') and response.headers["cache-control"].startswith("public, max-age=")
+
+        query_counter.clear()
+        response = client.get(path, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        # Only the data version is read
+        assert len(query_counter) == 1 and "data_version" in query_counter[0]
+
+
+def test_stats_etag_changes_on_log_write(client, db_session):
+    _seed_users(db_session, 1)
+    etag = client.get("/api/stats/progress").headers["etag"]
+    assert client.get("/api/stats/progress", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    _seed_users(db_session, 1, start=1)
+    response = client.get("/api/stats/progress", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["total_steps"] == 3 * 100 + 3 * 200
+
+
+def test_signup_invalidates_leaderboard_etag(client, db_session):
+    from backend import auth
+    response = client.get("/api/stats/leaderboard", params={"page": 1})
+    assert response.json()["total_users"] == 0
+    etag = response.headers["etag"]
+
+    # First login creates the user, who ranks with 0 steps
+    token = auth.create_access_token(data={"sub": "newcomer@example.com"})
+    assert client.get("/api/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+    response = client.get("/api/stats/leaderboard", params={"page": 1}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["total_users"] == 1
+
+
+def test_stats_query_budget(client, db_session, query_budget):
+    _seed_users(db_session, 20)
+    for path in ("/api/stats/progress", "/api/stats/weekly", "/api/stats/leaderboard"):
+        # The data version, then one aggregate query
+        with query_budget(2):
+            assert client.get(path).status_code == 200
+
+
+def _seed_ranking(db_session):
+    """Seven users, two pairs tied. Returns their principals in leaderboard order."""
+    users = []
+    for i, steps in enumerate([700, 600, 600, 400, 300, 300, 100]):
+        user = models.User(email=f"rank{i}@example.com")
+        db_session.add(user)
+        db_session.flush()
+        crud.create_running_log(db_session, models.RunningLog(
+            owner_id=user.id, running_datetime=datetime(2023, 1, 1), step_count=steps, distance_km=steps / 1500
+        ), user_id=user.id)
+        users.append(user)
+    return [Principal.from_user(user) for user in users]
+
+
+def test_leaderboard_pages(client, db_session):
+    _seed_ranking(db_session)
+    first = client.get("/api/stats/leaderboard", params={"page": 1, "page_size": 3}).json()
+    assert (first["total_users"], first["total_pages"]) == (7, 3)
+    assert [(e["rank"], e["steps"]) for e in first["items"]] == [(1, 700), (2, 600), (2, 600)]
+
+    pages = [client.get("/api/stats/leaderboard", params={"page": p, "page_size": 3}).json()["items"] for p in (2, 3, 4)]
+    assert [(e["rank"], e["steps"]) for e in pages[0] + pages[1]] == [(4, 400), (5, 300), (5, 300), (7, 100)]
+    assert pages[2] == []
+    assert client.get("/api/stats/leaderboard", params={"page": 0}).status_code == 422
+
+
+def test_me_rank_matches_leaderboard(client, db_session):
+    from backend.main import app
+    from backend.auth import get_current_user
+    users = _seed_ranking(db_session)
+    full = client.get("/api/stats/leaderboard", params={"page": 1, "page_size": 10}).json()["items"]
+
+    for position, user in enumerate(users):
+        app.dependency_overrides[get_current_user] = lambda user=user: user
+        data = client.get("/api/me/rank", params={"around": 1}).json()
+        assert data["rank"] == full[position]["rank"]
+        assert data["total_users"] == 7
+        start = max(position - 1, 0)
+        window = full[start:position + 2]
+        assert [(e["rank"], e["steps"]) for e in data["around"]] == [(e["rank"], e["steps"]) for e in window]
+        assert [e["is_me"] for e in data["around"]] == [start + i == position for i in range(len(window))]
+
+    app.dependency_overrides[get_current_user] = lambda: users[0]
+    assert client.get("/api/me/rank").json()["percentile"] == 100
+    app.dependency_overrides[get_current_user] = lambda: users[5]
+    # Rank 5 of 7: percent rank (5 - 1) / (7 - 1)
+    assert abs(client.get("/api/me/rank").json()["percentile"] - 100 / 3) < 1e-6
+
+
+def test_ranking_query_budget(client, db_session, query_budget):
+    from backend.main import app
+    from backend.auth import get_current_user
+    users = _seed_ranking(db_session)
+    _seed_users(db_session, 30)
+    app.dependency_overrides[get_current_user] = lambda: users[3]
+    # Data version, user count, one page
+    with query_budget(3):
+        client.get("/api/stats/leaderboard", params={"page": 2})
+    # Data version, the caller's row, the window
+    with query_budget(3):
+        client.get("/api/me/rank")
+
+
+def _seed_series(db_session):
+    user = models.User(email="series@example.com")
+    other = models.User(email="other@example.com")
+    db_session.add_all([user, other])
+    db_session.flush()
+    # The first and last logs fall outside the 2023 event window
+    for owner, when, steps in [
+        (user, datetime(2022, 12, 31, 23, 30), 999), (user, datetime(2023, 1, 1, 8), 100),
+        (user, datetime(2023, 1, 2, 8), 200), (other, datetime(2023, 1, 2, 18), 50),
+        (user, datetime(2023, 2, 14, 8), 400), (other, datetime(2023, 12, 31, 23, 59), 800),
+        (user, datetime(2024, 1, 1, 0, 1), 999),
+    ]:
+        crud.create_running_log(db_session, models.RunningLog(
+            owner_id=owner.id, running_datetime=when, step_count=steps, distance_km=steps / 1500
+        ), user_id=owner.id)
+    return Principal.from_user(user)
+
+
+def test_step_series_granularities_and_window(client, db_session):
+    _seed_series(db_session)
+
+    day = client.get("/api/stats/series").json()
+    assert (day["granularity"], day["start"], day["end"]) == ("day", "2023-01-01", "2023-12-31")
+    assert [(p["period"], p["steps"], p["log_count"]) for p in day["points"]] == [
+        ("2023-01-01", 100, 1), ("2023-01-02", 250, 2), ("2023-02-14", 400, 1), ("2023-12-31", 800, 1)
+    ]
+
+    week = client.get("/api/stats/series", params={"granularity": "week"}).json()["points"]
+    # Same labels as the weekly rollups
+    assert [(p["period"], p["steps"]) for p in week] == [
+        ("2023-W00", 100), ("2023-W01", 250), ("2023-W07", 400), ("2023-W52", 800)
+    ]
+    month = client.get("/api/stats/series", params={"granularity": "month"}).json()["points"]
+    assert [(p["period"], p["steps"]) for p in month] == [("2023-01", 350), ("2023-02", 400), ("2023-12", 800)]
+
+    # Requested ranges are clamped to the event window
+    clamped = client.get("/api/stats/series", params={"start": "2022-06-01", "end": "2023-01-02"}).json()
+    assert (clamped["start"], clamped["end"]) == ("2023-01-01", "2023-01-02")
+    assert sum(p["steps"] for p in clamped["points"]) == 350
+    outside = client.get("/api/stats/series", params={"start": "2024-01-01"}).json()
+    assert outside["points"] == []
+
+    assert client.get("/api/stats/series", params={"granularity": "year"}).status_code == 422
+
+
+def test_user_step_series(client, db_session):
+    from backend.main import app
+    from backend.auth import get_current_user
+    user = _seed_series(db_session)
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    points = client.get("/api/me/series", params={"granularity": "month"}).json()["points"]
+    assert [(p["period"], p["steps"]) for p in points] == [("2023-01", 300), ("2023-02", 400)]
+    response = client.get("/api/me/series", params={"start": "2023-01-02", "end": "2023-01-31"})
+    assert [p["period"] for p in response.json()["points"]] == ["2023-01-02"]
+    assert client.get("/api/me/series", params={"start": "2023-01-02", "end": "2023-01-31"},
+                      headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+
+def test_step_series_uses_datetime_index(db_session, query_counter):
+    from sqlalchemy import text
+    crud.get_step_series(db_session, "month", datetime(2023, 1, 1), datetime(2024, 1, 1))
+    statement = query_counter[-1]
+    params = ["%Y-%m", "2023-01-01 00:00:00.000000", "2024-01-01 00:00:00.000000"]
+    plan = db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(params)).fetchall()
+    assert "ix_running_logs_datetime_steps" in " ".join(row[-1] for row in plan)
@@ -0,0 +1,57 @@
+"""
+Startup warm-up, run by the app lifespan before the worker accepts requests.
+
+Work the first requests would otherwise pay for is done up front: reading the
+settings, importing the JWT/crypto stack (loaded lazily, so CLIs and
+migrations never import it), opening a connection on every database engine,
+and fetching the OIDC discovery document and signing keys. A failing step is
+logged and does not stop the worker; the request that needs it retries it.
+"""
+import inspect
+import logging
+import time
+from typing import Dict, Iterable
+
+from . import async_crud, auth, config
+
+logger = logging.getLogger(__name__)
+
+
+def load_auth_stack():
+    from jose import jwt  # noqa: F401  (loads the cryptography backend too)
+
+
+async def prime_database(session_factories: Iterable):
+    """Opens one pooled connection per factory's engine (applying the pragma profile) and runs a query on it."""
+    for session_factory in session_factories:
+        async with session_factory() as db:
+            await async_crud.get_data_version(db)
+
+
+async def prime_oidc(issuer: str):
+    if issuer:
+        # Fetches discovery and the JWKS in one refresh
+        await auth.get_oidc_cache(issuer).get_signing_keys(None)
+
+
+async def warm_up(session_factories: Iterable, issuer: str = "") -> Dict[str, float]:
+    """Runs every step. Returns the seconds each took."""
+    timings = {}
+
+    async def step(name: str, run):
+        started = time.perf_counter()
+        try:
+            result = run()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+        timings[name] = time.perf_counter() - started
+
+    await step("settings", config.get_settings)
+    await step("auth", load_auth_stack)
+    await step("database", lambda: prime_database(session_factories))
+    await step("oidc", lambda: prime_oidc(issuer))
+
+    logger.info("Warm-up took " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items()))
+    return timings
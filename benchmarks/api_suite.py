@@ -0,0 +1,312 @@
+"""
+Latency and query counts of every API route on synthetic data.
+
+For each scale (users x logs per user) a fresh SQLite database is seeded with
+deterministic data spread across RUNORG_START_DATE..RUNORG_END_DATE, then each
+route of routers/users.py, routers/stats.py and /api/config is requested
+through the real app (httpx ASGITransport, real JWTs) and timed. Read routes
+run before write routes so every scale measures the same data.
+
+    python benchmarks/api_suite.py run --scales 50x20,200x100 --output bench.json
+    python benchmarks/api_suite.py run --baseline main.json --output bench.json
+    python benchmarks/api_suite.py compare main.json bench.json --threshold 0.25
+
+`compare` (and `run --baseline`) exits 1 when a route's median latency grew by
+more than the threshold, or it now issues more queries per request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from backend import auth, crud, models, snapshot
+from backend.config import get_settings
+from backend.database import Base, create_async_db_engine, create_db_engine, get_async_db, get_read_db
+from backend.main import app
+from backend.routers import stats
+
+settings = get_settings()
+
+
+def parse_scales(value: str):
+    scales = []
+    for item in value.split(","):
+        users, logs_per_user = item.lower().split("x")
+        scales.append((int(users), int(logs_per_user)))
+    return scales
+
+
+def generate(SessionLocal, users: int, logs_per_user: int, seed: int = 42):
+    """Seeds `users` users with `logs_per_user` logs each. The same arguments always give the same data."""
+    rng = random.Random(seed)
+    start = datetime.fromisoformat(settings.RUNORG_START_DATE)
+    span_seconds = int((datetime.fromisoformat(settings.RUNORG_END_DATE) + timedelta(days=1) - start).total_seconds())
+    with SessionLocal() as db:
+        for i in range(users):
+            user = models.User(email=f"bench{i}@example.com", firstname=f"Runner{i}", lastname="Bench")
+            db.add(user)
+            db.flush()
+            logs = []
+            for _ in range(logs_per_user):
+                steps = rng.randint(500, 20000)
+                logs.append(models.RunningLog(
+                    owner_id=user.id,
+                    running_datetime=start + timedelta(seconds=rng.randrange(span_seconds)),
+                    step_count=steps,
+                    distance_km=steps / settings.RUNORG_STEP_PER_KM,
+                ))
+            crud.bulk_create_running_logs(db, logs)
+
+
+def _bulk_body(rng: random.Random, rows: int) -> str:
+    return json.dumps([
+        {"running_datetime": f"{settings.RUNORG_START_DATE}T{rng.randrange(24):02d}:00:00", "step_count": rng.randint(500, 20000)}
+        for _ in range(rows)
+    ])
+
+
+async def _time(client, requests: int, make_request, queries: list):
+    """Runs `make_request(i)` `requests` times. Returns latencies (s) and queries per request."""
+    latencies = []
+    query_counts = []
+    for i in range(requests):
+        queries.clear()
+        started = time.perf_counter()
+        response = await make_request(i)
+        latencies.append(time.perf_counter() - started)
+        query_counts.append(len(queries))
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.request.method} {response.request.url.path}: {response.status_code} {response.text}")
+    return latencies, query_counts
+
+
+def _summary(latencies, query_counts):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[max(int(len(ordered) * 0.95) - 1, 0)] * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "queries": max(query_counts),
+    }
+
+
+async def bench_routes(client, requests: int, queries: list):
+    rng = random.Random(7)
+    headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': 'bench0@example.com'})}"}
+    log_ids = [log["id"] for log in (await client.get("/api/me/logs", params={"limit": 1000}, headers=headers)).json()]
+    first_page = (await client.get("/api/me/logs", params={"cursor": "", "limit": 20}, headers=headers)).json()
+    leaderboard_etag = (await client.get("/api/stats/leaderboard")).headers["etag"]
+    new_log = {"running_datetime": f"{settings.RUNORG_START_DATE}T07:00:00", "step_count": 4000}
+
+    async def create_for_delete(i):
+        return await client.post("/api/me/logs", json=new_log, headers=headers)
+
+    routes = [
+        ("GET /api/config", lambda i: client.get("/api/config")),
+        ("GET /api/stats/progress", lambda i: client.get("/api/stats/progress")),
+        ("GET /api/stats/weekly", lambda i: client.get("/api/stats/weekly")),
+        ("GET /api/stats/series?granularity=week", lambda i: client.get("/api/stats/series", params={"granularity": "week"})),
+        ("GET /api/stats/snapshot", lambda i: client.get("/api/stats/snapshot")),
+        ("GET /api/stats/leaderboard", lambda i: client.get("/api/stats/leaderboard")),
+        ("GET /api/stats/leaderboard?page", lambda i: client.get("/api/stats/leaderboard", params={"page": 2})),
+        ("GET /api/stats/leaderboard (304)", lambda i: client.get("/api/stats/leaderboard", headers={"If-None-Match": leaderboard_etag})),
+        ("GET /api/me", lambda i: client.get("/api/me", headers=headers)),
+        ("GET /api/me/rank", lambda i: client.get("/api/me/rank", headers=headers)),
+        ("GET /api/me/series", lambda i: client.get("/api/me/series", headers=headers)),
+        ("GET /api/me/weekly", lambda i: client.get("/api/me/weekly", headers=headers)),
+        ("GET /api/me/logs", lambda i: client.get("/api/me/logs", headers=headers)),
+        ("GET /api/me/logs?cursor", lambda i: client.get(
+            "/api/me/logs", params={"cursor": first_page["next_cursor"] or "", "limit": 20}, headers=headers
+        )),
+        ("PUT /api/me", lambda i: client.put("/api/me", json={"firstname": f"Runner{i}"}, headers=headers)),
+        ("POST /api/me/logs", lambda i: client.post("/api/me/logs", json=new_log, headers=headers)),
+        ("POST /api/me/logs/bulk (50 rows)", lambda i: client.post(
+            "/api/me/logs/bulk", content=_bulk_body(rng, 50), headers={**headers, "Content-Type": "application/json"}
+        )),
+        ("PUT /api/me/logs/{id}", lambda i: client.put(
+            f"/api/me/logs/{log_ids[i % len(log_ids)]}", json={**new_log, "step_count": 4000 + i}, headers=headers
+        )),
+    ]
+
+    results = {}
+    for name, make_request in routes:
+        # Warm up caches (principal cache, prepared statements) outside the measurement
+        await make_request(0)
+        results[name] = _summary(*await _time(client, requests, make_request, queries))
+
+    # Deletes need a fresh log per request
+    created = [(await create_for_delete(i)).json()["id"] for i in range(requests)]
+    results["DELETE /api/me/logs/{id}"] = _summary(*await _time(
+        client, requests, lambda i: client.delete(f"/api/me/logs/{created[i]}", headers=headers), queries
+    ))
+    return results
+
+
+def run_scale(users: int, logs_per_user: int, requests: int, seed: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        engine = create_db_engine(url, settings=settings)
+        async_engine = create_async_db_engine(url, settings=settings)
+        read_engine = create_async_db_engine(url, settings=settings, read_only=True)
+        Base.metadata.create_all(bind=engine)
+        generate(sessionmaker(autocommit=False, autoflush=False, bind=engine), users, logs_per_user, seed)
+
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        AsyncReadSessionLocal = async_sessionmaker(read_engine, autoflush=False, expire_on_commit=False)
+
+        async def override_get_async_db():
+            async with AsyncSessionLocal() as db:
+                yield db
+
+        async def override_get_read_db():
+            async with AsyncReadSessionLocal() as db:
+                yield db
+
+        queries = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            queries.append(statement)
+
+        async def go():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                return await bench_routes(client, requests, queries)
+
+        engines = (async_engine.sync_engine, read_engine.sync_engine)
+        for target in engines:
+            event.listen(target, "before_cursor_execute", count)
+        app.dependency_overrides[get_async_db] = override_get_async_db
+        app.dependency_overrides[get_read_db] = override_get_read_db
+        # A snapshot built at the previous scale must not be served at this one
+        builder = stats.snapshot_builder
+        stats.snapshot_builder = snapshot.SnapshotBuilder(
+            builder.build, AsyncReadSessionLocal,
+            interval=builder.interval, poll_interval=builder.poll_interval, max_staleness=builder.max_staleness,
+        )
+        auth.principal_cache.clear()
+        try:
+            results = asyncio.run(go())
+        finally:
+            stats.snapshot_builder = builder
+            app.dependency_overrides.pop(get_async_db, None)
+            app.dependency_overrides.pop(get_read_db, None)
+            for target in engines:
+                event.remove(target, "before_cursor_execute", count)
+            asyncio.run(read_engine.dispose())
+            asyncio.run(async_engine.dispose())
+            engine.dispose()
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta_ms: float):
+    """Returns (rows, regressions). A row is (scale, route, baseline p50, current p50, change, flag)."""
+    rows, regressions = [], []
+    for scale, routes in current["results"].items():
+        for route, now in routes.items():
+            before = baseline["results"].get(scale, {}).get(route)
+            if before is None:
+                rows.append((scale, route, None, now["p50_ms"], None, "new"))
+                continue
+            change = now["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+            flags = []
+            if change > threshold and now["p50_ms"] - before["p50_ms"] > min_delta_ms:
+                flags.append("slower")
+            if now["queries"] > before["queries"]:
+                flags.append(f"queries {before['queries']}->{now['queries']}")
+            row = (scale, route, before["p50_ms"], now["p50_ms"], change, ", ".join(flags))
+            rows.append(row)
+            if flags:
+                regressions.append(row)
+    return rows, regressions
+
+
+def print_results(results: dict):
+    print(f"{'scale':<10} {'route':<36} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'queries':>7}")
+    for scale, routes in results["results"].items():
+        for route, r in routes.items():
+            print(f"{scale:<10} {route:<36} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['mean_ms']:>8.2f} {r['queries']:>7}")
+
+
+def print_comparison(rows):
+    print(f"{'scale':<10} {'route':<36} {'base ms':>8} {'now ms':>8} {'change':>8}  flags")
+    for scale, route, before, now, change, flags in rows:
+        before_text = f"{before:>8.2f}" if before is not None else f"{'-':>8}"
+        change_text = f"{change:>+8.0%}" if change is not None else f"{'-':>8}"
+        print(f"{scale:<10} {route:<36} {before_text} {now:>8.2f} {change_text}  {flags}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="benchmark every route and write JSON results")
+    run.add_argument("--scales", type=parse_scales, default=parse_scales("50x20,200x100"),
+                     help="comma separated USERSxLOGS_PER_USER (default: 50x20,200x100)")
+    run.add_argument("--requests", type=int, default=50, help="timed requests per route")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--output", help="write results to this JSON file")
+    run.add_argument("--baseline", help="compare against this results file and exit 1 on regressions")
+
+    cmp = commands.add_parser("compare", help="compare two results files")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+
+    for sub in (run, cmp):
+        sub.add_argument("--threshold", type=float, default=0.25, help="allowed p50 growth (default: 0.25 = 25%%)")
+        sub.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore p50 changes smaller than this")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        current = {
+            "meta": {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "requests": args.requests,
+                "seed": args.seed,
+            },
+            "results": {
+                f"{users}x{logs_per_user}": run_scale(users, logs_per_user, args.requests, args.seed)
+                for users, logs_per_user in args.scales
+            },
+        }
+        print_results(current)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(current, f, indent=2)
+        if not args.baseline:
+            return 0
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+
+    rows, regressions = compare(baseline, current, args.threshold, args.min_delta_ms)
+    print()
+    print_comparison(rows)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Event loop blocking: synchronous vs async database access in async handlers.
+
+Runs two variants of the same pair of endpoints in one process:
+
+- blocking: `async def` handlers calling crud with a synchronous Session, the
+  pattern get_current_user used before the async layer
+- async: the same calls through async_crud on an AsyncSession (aiosqlite)
+
+A number of clients repeatedly request a cheap per-user summary while one
+client keeps running a slow full-table aggregate. With blocking handlers the
+slow query stalls every in-flight request on the event loop.
+
+    python benchmarks/async_db.py --users 200 --logs-per-user 200 --clients 20 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from backend import aggregates, async_crud, crud, models
+from backend.config import get_settings
+from backend.database import Base, create_async_db_engine, create_db_engine
+
+
+def seed(SessionLocal, users: int, logs_per_user: int):
+    with SessionLocal() as db:
+        for i in range(users):
+            user = models.User(email=f"bench{i}@example.com")
+            db.add(user)
+            db.flush()
+            crud.bulk_create_running_logs(db, [
+                models.RunningLog(
+                    owner_id=user.id,
+                    running_datetime=datetime(2023, 1, 1) + timedelta(hours=j * 7),
+                    step_count=1000 + j,
+                    distance_km=(1000 + j) / 1500,
+                )
+                for j in range(logs_per_user)
+            ])
+
+
+def build_app(SessionLocal, AsyncSessionLocal) -> FastAPI:
+    app = FastAPI()
+
+    def get_db():
+        with SessionLocal() as db:
+            yield db
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    @app.get("/blocking/me/{user_id}")
+    async def blocking_me(user_id: int, db: Session = Depends(get_db)):
+        return crud.get_user_summary(db, user_id)
+
+    @app.get("/blocking/scan")
+    async def blocking_scan(db: Session = Depends(get_db)):
+        return len(aggregates.rebuild_weekly_totals(db, dry_run=True))
+
+    @app.get("/async/me/{user_id}")
+    async def async_me(user_id: int, db: AsyncSession = Depends(get_async_db)):
+        return await async_crud.get_user_summary(db, user_id)
+
+    @app.get("/async/scan")
+    async def async_scan(db: AsyncSession = Depends(get_async_db)):
+        return len(await db.run_sync(aggregates.rebuild_weekly_totals, dry_run=True))
+
+    return app
+
+
+async def load(app: FastAPI, variant: str, clients: int, seconds: float, users: int):
+    latencies = []
+    scans = 0
+    stop = time.monotonic() + seconds
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def cheap(n):
+            i = n
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                response = await client.get(f"/{variant}/me/{i % users + 1}")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+                i += clients
+
+        async def slow():
+            nonlocal scans
+            while time.monotonic() < stop:
+                (await client.get(f"/{variant}/scan")).raise_for_status()
+                scans += 1
+
+        await asyncio.gather(slow(), *(cheap(n) for n in range(clients)))
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "scans": scans,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--logs-per-user", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    settings = get_settings()
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        engine = create_db_engine(url, settings=settings)
+        async_engine = create_async_db_engine(url, settings=settings)
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        seed(SessionLocal, args.users, args.logs_per_user)
+
+        app = build_app(SessionLocal, AsyncSessionLocal)
+        results = {
+            variant: asyncio.run(load(app, variant, args.clients, args.seconds, args.users))
+            for variant in ("blocking", "async")
+        }
+        engine.dispose()
+
+    print(f"{'variant':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'scans':>6}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['max_ms']:>8.1f} {r['scans']:>6}")
+
+
+if __name__ == "__main__":
+    main()
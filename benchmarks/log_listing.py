@@ -0,0 +1,130 @@
+"""
+Log listing: ORM instances and response_model validation vs column rows serialized by a TypeAdapter.
+
+Runs two variants of GET /api/me/logs in one process against the same data:
+
+- orm: crud.get_running_logs hydrates RunningLog instances and FastAPI
+  validates each through schemas.RunningLog (from_attributes) before encoding,
+  the path the endpoint used before
+- rows: crud.get_running_log_rows selects the columns as tuples and
+  schemas.running_log_rows dumps them to JSON in one call
+
+Requests are sequential, so the numbers are per-request CPU and query time.
+
+    python benchmarks/log_listing.py --logs 1000 --limits 50,200,1000 --requests 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI, Response
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from backend import async_crud, crud, models, schemas
+from backend.config import get_settings
+from backend.database import Base, create_async_db_engine, create_db_engine
+
+
+def seed(SessionLocal, logs: int) -> int:
+    with SessionLocal() as db:
+        user = models.User(email="bench@example.com")
+        db.add(user)
+        db.flush()
+        crud.bulk_create_running_logs(db, [
+            models.RunningLog(
+                owner_id=user.id,
+                running_datetime=datetime(2023, 1, 1) + timedelta(hours=j * 7),
+                step_count=1000 + j,
+                distance_km=(1000 + j) / 1500,
+            )
+            for j in range(logs)
+        ])
+        return user.id
+
+
+def build_app(AsyncSessionLocal, user_id: int) -> FastAPI:
+    app = FastAPI()
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    @app.get("/orm/logs", response_model=List[schemas.RunningLog])
+    async def orm_logs(limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+        return await async_crud.get_running_logs(db, user_id=user_id, limit=limit)
+
+    @app.get("/rows/logs", response_model=List[schemas.RunningLog])
+    async def rows_logs(limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+        rows = await async_crud.get_running_log_rows(db, user_id=user_id, limit=limit)
+        return Response(schemas.running_log_rows.dump_json(rows), media_type="application/json")
+
+    return app
+
+
+async def load(app: FastAPI, variant: str, limit: int, requests: int):
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up statement caches and the pool
+        (await client.get(f"/{variant}/logs", params={"limit": limit})).raise_for_status()
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = await client.get(f"/{variant}/logs", params={"limit": limit})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        body = response.content
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "rows_per_s": limit * len(latencies) / sum(latencies),
+        "body": body,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logs", type=int, default=1000)
+    parser.add_argument("--limits", default="50,200,1000", help="Comma separated page sizes")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args(argv)
+    limits = [int(limit) for limit in args.limits.split(",")]
+
+    settings = get_settings()
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        engine = create_db_engine(url, settings=settings)
+        async_engine = create_async_db_engine(url, settings=settings)
+        Base.metadata.create_all(bind=engine)
+        user_id = seed(sessionmaker(autocommit=False, autoflush=False, bind=engine), args.logs)
+        app = build_app(async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False), user_id)
+
+        results = {}
+        for limit in limits:
+            for variant in ("orm", "rows"):
+                results[limit, variant] = asyncio.run(load(app, variant, limit, args.requests))
+            if results[limit, "orm"]["body"] != results[limit, "rows"]["body"]:
+                raise SystemExit(f"Responses differ at limit={limit}")
+        engine.dispose()
+
+    print(f"{'limit':>6} {'variant':<8} {'p50 ms':>8} {'p95 ms':>8} {'rows/s':>10} {'speedup':>8}")
+    for limit in limits:
+        for variant in ("orm", "rows"):
+            r = results[limit, variant]
+            speedup = results[limit, "orm"]["p50_ms"] / r["p50_ms"]
+            print(f"{limit:>6} {variant:<8} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['rows_per_s']:>10.0f} {speedup:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Concurrent read/write throughput of the SQLite engine profile.
+
+Compares the engine database.py used to build (rollback journal, default
+pragmas, check_same_thread=False only) with the settings-driven profile from
+create_db_engine. Writers go through crud.create_running_log, readers hit the
+stats queries. Every reader and writer is a separate process, as with
+multiple uvicorn workers, so the numbers reflect SQLite locking rather than
+the GIL.
+
+    python benchmarks/sqlite_profile.py --writers 4 --readers 8 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models
+from backend.config import get_settings
+from backend.database import Base, create_db_engine
+
+
+def make_engine(profile: str, path: str):
+    if profile == "baseline":
+        return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    return create_db_engine(f"sqlite:///{path}", settings=get_settings())
+
+
+def seed(profile: str, path: str, users: int):
+    engine = make_engine(profile, path)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        db.add_all([models.User(email=f"bench{i}@example.com") for i in range(users)])
+        db.commit()
+        user_ids = [user.id for user in db.query(models.User)]
+    engine.dispose()
+    return user_ids
+
+
+def worker(role: str, n: int, profile: str, path: str, user_ids, start_at: float, stop_at: float, results):
+    # Each worker is its own process with its own engine, like uvicorn workers
+    engine = make_engine(profile, path)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    done = errors = 0
+    while time.time() < start_at:
+        time.sleep(0.001)
+    with Session() as db:
+        while time.time() < stop_at:
+            user_id = user_ids[(n + done) % len(user_ids)]
+            try:
+                if role == "writer":
+                    crud.create_running_log(db, models.RunningLog(
+                        owner_id=user_id,
+                        running_datetime=datetime(2023, 1, 1) + timedelta(minutes=done),
+                        step_count=1000,
+                        distance_km=1000 / 1500,
+                    ), user_id=user_id)
+                else:
+                    crud.get_organization_stats(db, 1000000)
+                    crud.get_leaderboard(db, 5)
+                    crud.get_user_stats(db, user_id)
+                    crud.get_weekly_stats(db)
+                    db.rollback()  # end the read transaction
+                done += 1
+            except OperationalError:
+                db.rollback()
+                errors += 1
+    engine.dispose()
+    results.put((role, done, errors))
+
+
+def run(profile: str, path: str, writers: int, readers: int, seconds: float, users: int):
+    user_ids = seed(profile, path, users)
+    results = multiprocessing.Queue()
+    start_at = time.time() + 1.0  # let every process import and connect first
+    stop_at = start_at + seconds
+    processes = [
+        multiprocessing.Process(target=worker, args=(role, n, profile, path, user_ids, start_at, stop_at, results))
+        for role, count in (("writer", writers), ("reader", readers))
+        for n in range(count)
+    ]
+    for process in processes:
+        process.start()
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    for _ in processes:
+        role, done, errors = results.get()
+        counts["writes" if role == "writer" else "reads"] += done
+        counts["errors"] += errors
+    for process in processes:
+        process.join()
+    return {"writes": counts["writes"] / seconds, "reads": counts["reads"] / seconds, "errors": counts["errors"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            profile: run(profile, f"{tmp}/{profile}.db", args.writers, args.readers, args.seconds, args.users)
+            for profile in ("baseline", "profile")
+        }
+
+    print(f"{'engine':<10} {'writes/s':>10} {'reads/s':>10} {'errors':>8}")
+    for name, result in results.items():
+        print(f"{name:<10} {result['writes']:>10.1f} {result['reads']:>10.1f} {result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Worker cold start: import time of the app and time to the first successful responses.
+
+import: imports backend.main in `--runs` fresh interpreters and reports the
+median time, and whether the auth stack (jose, cryptography, httpx) was
+loaded by it. The time to import that stack afterwards is what the first
+authenticated request pays when nothing warmed it up.
+
+serve: starts uvicorn on an empty, migrated SQLite database `--runs` times
+with the lifespan warm-up on and off (RUNORG_WARMUP_ENABLED), and measures
+the time until the worker answers, then the first and second requests of a
+stats route, an authenticated route (JWT decode, first-login user upsert) and
+/api/config (OIDC discovery when --issuer is given).
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --runs 5 --issuer https://dex.example.com
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+from sqlalchemy import create_engine
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import backend.main
+app_seconds = time.perf_counter() - started
+loaded = sorted(m for m in ("jose", "cryptography", "httpx") if m in sys.modules)
+started = time.perf_counter()
+from jose import jwt
+import httpx
+print(json.dumps({"app": app_seconds, "auth_stack": time.perf_counter() - started, "loaded": loaded}))
+"""
+
+
+def measure_import(runs: int):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout))
+    return {
+        "app_ms": statistics.median(s["app"] for s in samples) * 1000,
+        "auth_stack_ms": statistics.median(s["auth_stack"] for s in samples) * 1000,
+        "loaded": samples[-1]["loaded"],
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def timed_get(client: httpx.Client, url: str, **kwargs) -> float:
+    started = time.perf_counter()
+    client.get(url, **kwargs).raise_for_status()
+    return time.perf_counter() - started
+
+
+def serve_once(db_path: str, warmup: bool, issuer: str, token: str, timeout: float = 30.0):
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        RUNORG_WARMUP_ENABLED=str(warmup).lower(),
+        OIDC_ISSUER=issuer,
+    )
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        with httpx.Client(base_url=base, timeout=timeout) as client:
+            # uvicorn accepts connections once the lifespan startup (and warm-up) finished
+            deadline = started + timeout
+            while True:
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() > deadline or server.poll() is not None:
+                    raise SystemExit("Server did not start")
+                time.sleep(0.005)
+            result = {"ready": time.perf_counter() - started}
+            headers = {"Authorization": f"Bearer {token}"}
+            for name, url, kwargs in (
+                ("stats", "/api/stats/progress", {}),
+                ("me", "/api/me", {"headers": headers}),
+                ("config", "/api/config", {}),
+            ):
+                result[f"{name}_first"] = timed_get(client, url, **kwargs)
+                result[f"{name}_second"] = timed_get(client, url, **kwargs)
+            return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def measure_serve(runs: int, issuer: str):
+    from backend import auth
+    from backend.database import Base
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for warmup in (False, True):
+            samples = []
+            for run in range(runs):
+                db_path = os.path.join(tmp, f"startup-{warmup}-{run}.db")
+                engine = create_engine(f"sqlite:///{db_path}")
+                Base.metadata.create_all(bind=engine)
+                engine.dispose()
+                # A new user every run, so /api/me includes the first-login upsert
+                token = auth.create_access_token(data={"sub": f"startup{run}@example.com"})
+                samples.append(serve_once(db_path, warmup, issuer, token))
+            results["on" if warmup else "off"] = {
+                key: statistics.median(s[key] for s in samples) * 1000 for key in samples[0]
+            }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--issuer", default="", help="OIDC issuer to discover on /api/config (default: none)")
+    args = parser.parse_args(argv)
+
+    imports = measure_import(args.runs)
+    print(f"import backend.main: {imports['app_ms']:.1f} ms, auth stack loaded: {imports['loaded'] or 'none'}")
+    print(f"import jose + httpx afterwards: {imports['auth_stack_ms']:.1f} ms")
+    print()
+
+    serve = measure_serve(args.runs, args.issuer)
+    keys = list(serve["off"])
+    print(f"{'ms (median)':<16} " + " ".join(f"{key:>14}" for key in keys))
+    for variant in ("off", "on"):
+        print(f"{'warm-up ' + variant:<16} " + " ".join(f"{serve[variant][key]:>14.1f}" for key in keys))
+
+
+if __name__ == "__main__":
+    main()